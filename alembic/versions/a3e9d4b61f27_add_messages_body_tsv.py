@@ -0,0 +1,34 @@
+"""add full-text search column to messages
+
+Revision ID: a3e9d4b61f27
+Revises: e5c27b9f4a18
+Create Date: 2026-10-19 13:05:48.227390
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3e9d4b61f27'
+down_revision: Union[str, None] = 'e5c27b9f4a18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Generated column: Postgres computes it for existing rows and on every write
+    op.execute(
+        "ALTER TABLE messages ADD COLUMN body_tsv tsvector "
+        "GENERATED ALWAYS AS (to_tsvector('english', body)) STORED"
+    )
+    op.execute("CREATE INDEX ix_messages_body_tsv ON messages USING gin (body_tsv)")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_messages_body_tsv', table_name='messages')
+    op.drop_column('messages', 'body_tsv')
@@ -0,0 +1,57 @@
+"""add last_message to conversations and unread_count to participants
+
+Revision ID: b41e7c2a9d53
+Revises: 4fcd4f426094
+Create Date: 2026-10-19 10:12:04.318271
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b41e7c2a9d53'
+down_revision: Union[str, None] = '4fcd4f426094'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('conversations', sa.Column('last_message_id', sa.Integer(), nullable=True))
+    op.add_column('conversations', sa.Column('last_message_at', sa.DateTime(), nullable=True))
+    op.create_index(op.f('ix_conversations_last_message_at'), 'conversations', ['last_message_at'], unique=False)
+    op.add_column('conversation_participants', sa.Column('unread_count', sa.Integer(), server_default='0', nullable=False))
+    op.create_index(op.f('ix_conversation_participants_user_id'), 'conversation_participants', ['user_id'], unique=False)
+
+    # Backfill from existing history
+    op.execute("""
+        UPDATE conversations c
+        SET last_message_id = m.id, last_message_at = m.created_at
+        FROM (
+            SELECT DISTINCT ON (conversation_id) conversation_id, id, created_at
+            FROM messages
+            ORDER BY conversation_id, id DESC
+        ) m
+        WHERE m.conversation_id = c.id
+    """)
+    op.execute("""
+        UPDATE conversation_participants p
+        SET unread_count = (
+            SELECT count(*) FROM messages m
+            WHERE m.conversation_id = p.conversation_id
+              AND m.sender_id != p.user_id
+              AND (p.last_read_at IS NULL OR m.created_at > p.last_read_at)
+        )
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_conversation_participants_user_id'), table_name='conversation_participants')
+    op.drop_column('conversation_participants', 'unread_count')
+    op.drop_index(op.f('ix_conversations_last_message_at'), table_name='conversations')
+    op.drop_column('conversations', 'last_message_at')
+    op.drop_column('conversations', 'last_message_id')
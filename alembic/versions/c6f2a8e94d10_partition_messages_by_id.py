@@ -0,0 +1,107 @@
+"""partition messages by id range and add message_archive_segments
+
+Revision ID: c6f2a8e94d10
+Revises: a3e9d4b61f27
+Create Date: 2026-10-19 14:22:09.581734
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c6f2a8e94d10'
+down_revision: Union[str, None] = 'a3e9d4b61f27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Must match MESSAGES_PARTITION_SIZE at the time of migrating; later partitions
+# are created by app.message_archive from the highest existing bound
+PARTITION_SIZE = 1000000
+PARTITIONS_AHEAD = 2
+
+
+def _create_new_table(partition_by: str) -> None:
+    op.execute(f"""
+        CREATE TABLE messages_new (
+            id integer NOT NULL,
+            conversation_id integer NOT NULL,
+            sender_id integer NOT NULL,
+            body varchar NOT NULL,
+            created_at timestamp without time zone NOT NULL,
+            body_tsv tsvector GENERATED ALWAYS AS (to_tsvector('english', body)) STORED
+        ) {partition_by}
+    """)
+
+
+def _swap_in_new_table() -> None:
+    """Copy rows across, hand the id sequence over, and recreate constraints and indexes under their old names."""
+    op.execute("""
+        INSERT INTO messages_new (id, conversation_id, sender_id, body, created_at)
+        SELECT id, conversation_id, sender_id, body, created_at FROM messages
+    """)
+    op.execute("ALTER SEQUENCE messages_id_seq OWNED BY messages_new.id")
+    op.execute("DROP TABLE messages")
+    op.execute("ALTER TABLE messages_new RENAME TO messages")
+    op.execute("ALTER TABLE messages ALTER COLUMN id SET DEFAULT nextval('messages_id_seq')")
+    op.execute("ALTER TABLE messages ADD CONSTRAINT messages_pkey PRIMARY KEY (id)")
+    op.execute(
+        "ALTER TABLE messages ADD CONSTRAINT messages_conversation_id_fkey "
+        "FOREIGN KEY (conversation_id) REFERENCES conversations (id) ON DELETE CASCADE"
+    )
+    op.execute(
+        "ALTER TABLE messages ADD CONSTRAINT messages_sender_id_fkey "
+        "FOREIGN KEY (sender_id) REFERENCES users (id) ON DELETE CASCADE"
+    )
+    op.create_index('ix_messages_created_at', 'messages', ['created_at'], unique=False)
+    op.create_index('ix_messages_conversation_id_id', 'messages', ['conversation_id', 'id'], unique=False)
+    op.execute("CREATE INDEX ix_messages_body_tsv ON messages USING gin (body_tsv)")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    _create_new_table("PARTITION BY RANGE (id)")
+    op.execute(f"""
+        DO $$
+        DECLARE
+            bound bigint := {PARTITION_SIZE};
+            last_id bigint := (SELECT coalesce(max(id), 0) FROM messages);
+        BEGIN
+            EXECUTE format('CREATE TABLE messages_p0 PARTITION OF messages_new FOR VALUES FROM (MINVALUE) TO (%s)', bound);
+            WHILE bound <= last_id + {PARTITIONS_AHEAD * PARTITION_SIZE} LOOP
+                EXECUTE format(
+                    'CREATE TABLE messages_p%s PARTITION OF messages_new FOR VALUES FROM (%s) TO (%s)',
+                    bound, bound, bound + {PARTITION_SIZE}
+                );
+                bound := bound + {PARTITION_SIZE};
+            END LOOP;
+        END $$
+    """)
+    _swap_in_new_table()
+
+    op.create_table('message_archive_segments',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('conversation_id', sa.Integer(), nullable=False),
+    sa.Column('partition_name', sa.String(), nullable=False),
+    sa.Column('path', sa.String(), nullable=False),
+    sa.Column('byte_offset', sa.Integer(), nullable=False),
+    sa.Column('byte_length', sa.Integer(), nullable=False),
+    sa.Column('first_id', sa.Integer(), nullable=False),
+    sa.Column('last_id', sa.Integer(), nullable=False),
+    sa.Column('row_count', sa.Integer(), nullable=False),
+    sa.Column('archived_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['conversation_id'], ['conversations.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_message_archive_segments_conversation_id_last_id', 'message_archive_segments', ['conversation_id', 'last_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Archived history is not restored into the table; its files stay on disk
+    op.drop_index('ix_message_archive_segments_conversation_id_last_id', table_name='message_archive_segments')
+    op.drop_table('message_archive_segments')
+    _create_new_table("")
+    _swap_in_new_table()
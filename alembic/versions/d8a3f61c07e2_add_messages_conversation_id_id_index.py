@@ -0,0 +1,28 @@
+"""add (conversation_id, id) index to messages
+
+Revision ID: d8a3f61c07e2
+Revises: b41e7c2a9d53
+Create Date: 2026-10-19 11:02:47.905113
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd8a3f61c07e2'
+down_revision: Union[str, None] = 'b41e7c2a9d53'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_messages_conversation_id_id', 'messages', ['conversation_id', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_messages_conversation_id_id', table_name='messages')
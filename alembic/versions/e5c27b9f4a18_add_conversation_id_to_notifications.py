@@ -0,0 +1,46 @@
+"""add conversation_id to notifications
+
+Revision ID: e5c27b9f4a18
+Revises: d8a3f61c07e2
+Create Date: 2026-10-19 11:47:31.662058
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5c27b9f4a18'
+down_revision: Union[str, None] = 'd8a3f61c07e2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('notifications', sa.Column('conversation_id', sa.Integer(), nullable=True))
+    op.create_foreign_key(
+        'notifications_conversation_id_fkey', 'notifications', 'conversations',
+        ['conversation_id'], ['id'], ondelete='CASCADE',
+    )
+    op.create_index(op.f('ix_notifications_conversation_id'), 'notifications', ['conversation_id'], unique=False)
+
+    # Backfill message notifications from the JSON payload
+    op.execute("""
+        UPDATE notifications n
+        SET conversation_id = (n.data->>'conversation_id')::int
+        WHERE n.event_type IN ('new_dm_message', 'new_group_message')
+          AND n.data->>'conversation_id' IS NOT NULL
+          AND EXISTS (
+              SELECT 1 FROM conversations c WHERE c.id = (n.data->>'conversation_id')::int
+          )
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_notifications_conversation_id'), table_name='notifications')
+    op.drop_constraint('notifications_conversation_id_fkey', 'notifications', type_='foreignkey')
+    op.drop_column('notifications', 'conversation_id')
@@ -20,12 +20,27 @@ from app.routes import households  # APIRouter with /households/* endpoints
 from app.routes import messaging  # APIRouter with /ws + /conversations/* endpoints
 from app.routes import notifications  # APIRouter with /notifications/* endpoints
 from app.routes import devices # APIRouter with /devices/* endpoints
+from app.routes import presence  # APIRouter with /presence/* endpoints
+from app.read_receipts import read_receipts
+from app.presence import presence as presence_tracker
+from app.message_archive import message_archive
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
     Path("static/avatars").mkdir(parents=True,exist_ok=True)
+    read_receipts.start()
+    presence_tracker.start()
+    message_archive.start()
+    messaging.manager.start()
+    messaging.drain_sockets_on_signal()
     yield
+    # Shutdown
+    await messaging.manager.shutdown()
+    await presence_tracker.stop()
+    await message_archive.stop()
+    await messaging.drain_background_tasks()
+    await read_receipts.stop()
 
 app = FastAPI(lifespan=lifespan)
 
@@ -52,6 +67,7 @@ app.include_router(households.router)
 app.include_router(messaging.router)
 app.include_router(notifications.router)
 app.include_router(devices.router)
+app.include_router(presence.router)
 
 # Ensure static directory exists before mounting
 Path("static").mkdir(parents=True, exist_ok=True)
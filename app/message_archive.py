@@ -0,0 +1,271 @@
+from sqlalchemy import select, insert, text
+from sqlalchemy.ext.asyncio import AsyncSession, AsyncConnection
+from app.database import engine
+from app.models import message_archive_segments, MESSAGES_PARTITION_SIZE
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import NamedTuple
+import asyncio
+import gzip
+import json
+import os
+import re
+
+# Partitions to keep created beyond the one the id sequence is currently in
+PARTITIONS_AHEAD = int(os.getenv("MESSAGES_PARTITIONS_AHEAD", "2"))
+# A partition is archived once its newest message is older than this
+ARCHIVE_AFTER_DAYS = int(os.getenv("MESSAGES_ARCHIVE_AFTER_DAYS", "365"))
+ARCHIVE_DIR = os.getenv("MESSAGES_ARCHIVE_DIR", "archive/messages")
+ARCHIVE_INTERVAL = float(os.getenv("MESSAGES_ARCHIVE_INTERVAL", "3600"))
+# Messages per gzip member; bounds how much is decompressed to serve one page
+SEGMENT_ROWS = 500
+LOCK_TIMEOUT_MS = int(os.getenv("MESSAGES_ARCHIVE_LOCK_TIMEOUT_MS", "5000"))
+
+_BOUND_RE = re.compile(r"FROM \((\w+)\) TO \((\w+)\)")
+
+
+class ArchivedMessage(NamedTuple):
+    id: int
+    conversation_id: int
+    sender_id: int
+    body: str
+    created_at: datetime | None
+    sender_name: str | None = None
+
+
+class Partition(NamedTuple):
+    name: str
+    lower: int | None  # None for MINVALUE
+    upper: int
+
+
+# ── Message Archive ─────────────────────────────────────────────
+# messages is range-partitioned by id. This job keeps partitions created ahead
+# of the id sequence, and once every message in the oldest partition is older
+# than ARCHIVE_AFTER_DAYS, writes it to a gzip file on local disk, records
+# where each conversation's rows landed in message_archive_segments, and
+# detaches and drops the partition. Ids only grow, so archived history is
+# always older than anything still in the table; readers fall through to the
+# archive when a page runs past the live rows.
+
+class MessageArchive:
+    def __init__(self, archive_dir: str = ARCHIVE_DIR, interval: float = ARCHIVE_INTERVAL):
+        self.archive_dir = archive_dir
+        self.interval = interval
+        self._task: asyncio.Task | None = None
+
+    # ── Partition maintenance (Postgres only) ──
+
+    async def partitions(self, conn: AsyncConnection) -> list[Partition]:
+        result = await conn.execute(text(
+            "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) AS bound "
+            "FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = 'messages'::regclass"
+        ))
+        parts = []
+        for name, bound in result.fetchall():
+            match = _BOUND_RE.search(bound)
+            if not match:
+                continue  # DEFAULT partition
+            lower, upper = match.groups()
+            parts.append(Partition(name, None if lower == "MINVALUE" else int(lower), int(upper)))
+        return sorted(parts, key=lambda p: p.upper)
+
+    async def _current_id(self, conn: AsyncConnection) -> int:
+        result = await conn.execute(text(
+            "SELECT CASE WHEN is_called THEN last_value ELSE last_value - 1 END "
+            "FROM messages_id_seq"
+        ))
+        return result.scalar()
+
+    async def ensure_partitions(self, conn: AsyncConnection, through_id: int | None = None):
+        """Create partitions up to PARTITIONS_AHEAD past the current id (or `through_id`)."""
+        if conn.dialect.name != "postgresql":
+            return
+        parts = await self.partitions(conn)
+        current = await self._current_id(conn)
+        upper = parts[-1].upper if parts else current - current % MESSAGES_PARTITION_SIZE
+        target = max(current, through_id or 0) + PARTITIONS_AHEAD * MESSAGES_PARTITION_SIZE
+        while upper <= target:
+            await conn.execute(text(
+                f"CREATE TABLE IF NOT EXISTS messages_p{upper} PARTITION OF messages "
+                f"FOR VALUES FROM ({upper}) TO ({upper + MESSAGES_PARTITION_SIZE})"
+            ))
+            upper += MESSAGES_PARTITION_SIZE
+
+    async def archive_cold_partitions(self, older_than: datetime | None = None) -> list[str]:
+        """Archive partitions oldest first while they are full and entirely older
+        than the cutoff. Returns the names of the partitions archived."""
+        if older_than is None:
+            older_than = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=ARCHIVE_AFTER_DAYS)
+        archived = []
+        async with engine.connect() as conn:
+            if conn.dialect.name != "postgresql":
+                return archived
+            parts = await self.partitions(conn)
+            current = await self._current_id(conn)
+            await conn.rollback()
+
+        # Never the last remaining partition, nor one the sequence can still write into
+        for part in parts[:-1]:
+            if part.upper > current:
+                break
+            async with engine.connect() as conn:
+                newest = (await conn.execute(
+                    text(f"SELECT max(created_at) FROM {part.name}")
+                )).scalar()
+                await conn.rollback()
+            if newest is not None and newest >= older_than:
+                break
+            await self.archive_partition(part)
+            archived.append(part.name)
+        return archived
+
+    async def archive_partition(self, part: Partition):
+        """Write one partition to <archive_dir>/<name>.ndjson.gz, record its
+        segments, then detach and drop it — all or nothing on the DB side."""
+        Path(self.archive_dir).mkdir(parents=True, exist_ok=True)
+        path = str(Path(self.archive_dir) / f"{part.name}.ndjson.gz")
+        tmp_path = path + ".tmp"
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        segments = []
+
+        async with engine.begin() as conn:
+            # DETACH needs an exclusive lock on messages; waiting behind a long reader
+            # would queue every chat query behind it, so give up and retry next run
+            await conn.execute(text(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT_MS}ms'"))
+            result = await conn.stream(
+                text(
+                    f"SELECT id, conversation_id, sender_id, body, created_at FROM {part.name} "
+                    f"ORDER BY conversation_id, id"
+                ).execution_options(yield_per=SEGMENT_ROWS * 4)
+            )
+            with open(tmp_path, "wb") as f:
+                chunk: list = []
+                async for row in result:
+                    if chunk and (len(chunk) >= SEGMENT_ROWS or row.conversation_id != chunk[0].conversation_id):
+                        segments.append(await self._write_segment(f, chunk, part.name, path, now))
+                        chunk = []
+                    chunk.append(row)
+                if chunk:
+                    segments.append(await self._write_segment(f, chunk, part.name, path, now))
+                await asyncio.to_thread(lambda: (f.flush(), os.fsync(f.fileno())))
+            os.replace(tmp_path, path)
+
+            if segments:
+                await conn.execute(insert(message_archive_segments), segments)
+            await conn.execute(text(f"ALTER TABLE messages DETACH PARTITION {part.name}"))
+            await conn.execute(text(f"DROP TABLE {part.name}"))
+        print(f"[ARCHIVE] Archived {part.name}: {sum(s['row_count'] for s in segments)} messages to {path}")
+
+    @staticmethod
+    async def _write_segment(f, rows, partition_name: str, path: str, archived_at: datetime) -> dict:
+        data = gzip.compress("".join(
+            json.dumps({
+                "id": r.id,
+                "conversation_id": r.conversation_id,
+                "sender_id": r.sender_id,
+                "body": r.body,
+                "created_at": r.created_at.isoformat() if r.created_at else None,
+            }, ensure_ascii=False) + "\n"
+            for r in rows
+        ).encode("utf-8"))
+        offset = f.tell()
+        await asyncio.to_thread(f.write, data)
+        return {
+            "conversation_id": rows[0].conversation_id,
+            "partition_name": partition_name,
+            "path": path,
+            "byte_offset": offset,
+            "byte_length": len(data),
+            "first_id": rows[0].id,
+            "last_id": rows[-1].id,
+            "row_count": len(rows),
+            "archived_at": archived_at,
+        }
+
+    # ── Reads ──
+
+    @staticmethod
+    def _read_segment(path: str, offset: int, length: int) -> list[ArchivedMessage]:
+        with open(path, "rb") as f:
+            f.seek(offset)
+            data = gzip.decompress(f.read(length))
+        rows = []
+        for line in data.decode("utf-8").splitlines():
+            m = json.loads(line)
+            rows.append(ArchivedMessage(
+                m["id"], m["conversation_id"], m["sender_id"], m["body"],
+                datetime.fromisoformat(m["created_at"]) if m["created_at"] else None,
+            ))
+        return rows
+
+    async def read(
+        self, db: AsyncSession, conversation_id: int,
+        before: int | None = None, after: int | None = None, limit: int = 50,
+    ) -> list[ArchivedMessage]:
+        """Archived messages of a conversation, like one page of get_messages:
+        ids > `after` ascending, otherwise ids < `before` (if given) descending."""
+        query = select(message_archive_segments).where(
+            message_archive_segments.c.conversation_id == conversation_id
+        )
+        if after is not None:
+            query = query.where(message_archive_segments.c.last_id > after).order_by(
+                message_archive_segments.c.first_id.asc()
+            )
+        else:
+            if before is not None:
+                query = query.where(message_archive_segments.c.first_id < before)
+            query = query.order_by(message_archive_segments.c.last_id.desc())
+
+        rows: list[ArchivedMessage] = []
+        for seg in (await db.execute(query)).fetchall():
+            if len(rows) >= limit:
+                break
+            found = await asyncio.to_thread(self._read_segment, seg.path, seg.byte_offset, seg.byte_length)
+            if after is not None:
+                rows += [r for r in found if r.id > after]
+            else:
+                rows += [r for r in reversed(found) if before is None or r.id < before]
+        return rows[:limit]
+
+    async def iter_segments(self, db: AsyncSession, conversation_id: int):
+        """Yield a conversation's archived messages one segment at a time, oldest first."""
+        result = await db.execute(
+            select(message_archive_segments)
+            .where(message_archive_segments.c.conversation_id == conversation_id)
+            .order_by(message_archive_segments.c.first_id.asc())
+        )
+        for seg in result.fetchall():
+            yield await asyncio.to_thread(self._read_segment, seg.path, seg.byte_offset, seg.byte_length)
+
+    # ── Background job ──
+
+    async def run_once(self):
+        async with engine.begin() as conn:
+            await self.ensure_partitions(conn)
+        await self.archive_cold_partitions()
+
+    async def _run(self):
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                print(f"[ARCHIVE] Maintenance error: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+message_archive = MessageArchive()
@@ -1,5 +1,6 @@
-from sqlalchemy import JSON, Boolean, Date, Table, Column, Integer, String, Float, DateTime, MetaData, ForeignKey, UniqueConstraint
+from sqlalchemy import JSON, Boolean, Date, Table, Column, Integer, String, Float, DateTime, MetaData, ForeignKey, UniqueConstraint, Index, DDL, event
 from datetime import datetime
+import os
 
 metadata = MetaData()
 
@@ -240,6 +241,9 @@ conversations = Table(
     Column("type", String, nullable=False),  # "dm" or "group"
     Column("household_id", Integer, ForeignKey("households.id", ondelete="CASCADE"), nullable=True, unique=True),
     Column("created_at", DateTime, nullable=False),
+    # Denormalized pointer to the newest message, maintained on insert
+    Column("last_message_id", Integer, nullable=True),
+    Column("last_message_at", DateTime, nullable=True, index=True),
 )
 
 conversation_participants = Table(
@@ -247,12 +251,17 @@ conversation_participants = Table(
     metadata,
     Column("id", Integer, primary_key=True),
     Column("conversation_id", Integer, ForeignKey("conversations.id", ondelete="CASCADE"), nullable=False),
-    Column("user_id", Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+    Column("user_id", Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True),
     Column("joined_at", DateTime, nullable=False),
     Column("last_read_at", DateTime, nullable=True),
+    Column("unread_count", Integer, nullable=False, server_default="0"),
     UniqueConstraint("conversation_id", "user_id", name="uq_conversation_participant"),
 )
 
+# Messages are range-partitioned by id (Postgres); app.message_archive creates partitions
+# ahead of the id sequence and archives cold ones to compressed files
+MESSAGES_PARTITION_SIZE = int(os.getenv("MESSAGES_PARTITION_SIZE", "1000000"))
+
 messages = Table(
     "messages",
     metadata,
@@ -261,6 +270,48 @@ messages = Table(
     Column("sender_id", Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
     Column("body", String, nullable=False),
     Column("created_at", DateTime, nullable=False, index=True),
+    # Keyset pagination of a conversation's history: WHERE conversation_id = ? AND id < ? ORDER BY id
+    Index("ix_messages_conversation_id_id", "conversation_id", "id"),
+    postgresql_partition_by="RANGE (id)",
+)
+
+# Full-text search (Postgres only): a generated tsvector over body with a GIN index.
+# Kept out of the Table so select(messages) doesn't drag it along and other dialects
+# can still create_all; search falls back to LIKE there.
+MESSAGES_SEARCH_CONFIG = "english"
+for _ddl in (
+    f"ALTER TABLE messages ADD COLUMN body_tsv tsvector "
+    f"GENERATED ALWAYS AS (to_tsvector('{MESSAGES_SEARCH_CONFIG}', body)) STORED",
+    "CREATE INDEX ix_messages_body_tsv ON messages USING gin (body_tsv)",
+):
+    event.listen(messages, "after_create", DDL(_ddl).execute_if(dialect="postgresql"))
+
+# First partition; later ones are created ahead of the id sequence at runtime
+event.listen(
+    messages,
+    "after_create",
+    DDL(
+        f"CREATE TABLE messages_p0 PARTITION OF messages "
+        f"FOR VALUES FROM (MINVALUE) TO ({MESSAGES_PARTITION_SIZE})"
+    ).execute_if(dialect="postgresql"),
+)
+
+# Where archived message history lives: each row is one gzip member in `path`
+# holding up to a few hundred consecutive messages of one conversation
+message_archive_segments = Table(
+    "message_archive_segments",
+    metadata,
+    Column("id", Integer, primary_key=True),
+    Column("conversation_id", Integer, ForeignKey("conversations.id", ondelete="CASCADE"), nullable=False),
+    Column("partition_name", String, nullable=False),
+    Column("path", String, nullable=False),
+    Column("byte_offset", Integer, nullable=False),
+    Column("byte_length", Integer, nullable=False),
+    Column("first_id", Integer, nullable=False),
+    Column("last_id", Integer, nullable=False),
+    Column("row_count", Integer, nullable=False),
+    Column("archived_at", DateTime, nullable=False),
+    Index("ix_message_archive_segments_conversation_id_last_id", "conversation_id", "last_id"),
 )
 
 notifications = Table(
@@ -273,6 +324,8 @@ notifications = Table(
     Column("title", String, nullable=False),
     Column("body", String, nullable=False),
     Column("data", JSON, nullable=True),
+    # Set for message events so the per-conversation upsert can use an index instead of a JSON path
+    Column("conversation_id", Integer, ForeignKey("conversations.id", ondelete="CASCADE"), nullable=True, index=True),
     Column("read", Boolean, default=False, server_default="false"),
     Column("created_at", DateTime, default=datetime.utcnow, index=True),
 )
@@ -34,21 +34,32 @@ async def create_notification(
     )
     row = result.fetchone()
 
+    await push_notification(db, user_id, {
+        "id": row.id,
+        "event_type": event_type,
+        "actor_id": actor_id,
+        "title": title,
+        "body": body,
+        "data": data,
+        "created_at": row.created_at.isoformat(),
+    })
+
+
+async def push_notification(db: AsyncSession, user_id: int, notification: dict):
+    """Deliver an already-inserted notification: push via WebSocket to online users
+    and send FCM push notifications to all registered devices. Caller commits
+    (stale token deletes are issued on `db`)."""
+    title = notification["title"]
+    body = notification["body"]
+    data = notification["data"]
+
     # Push via WebSocket (import here to avoid circular imports)
     try:
         from app.routes.messaging import manager
         print(f"[NOTIF] Pushing to user {user_id}, active WS users: {list(manager.active.keys())}")
         await manager.send_to_user(user_id, {
             "type": "notification",
-            "notification": {
-                "id": row.id,
-                "event_type": event_type,
-                "actor_id": actor_id,
-                "title": title,
-                "body": body,
-                "data": data,
-                "created_at": row.created_at.isoformat(),
-            },
+            "notification": notification,
         })
         print(f"[NOTIF] Push sent successfully to user {user_id}")
     except Exception as e:
@@ -62,8 +73,8 @@ async def create_notification(
         )
 
         fcm_data = {
-            "event_type": event_type,
-            "notification_id": str(row.id),
+            "event_type": notification["event_type"],
+            "notification_id": str(notification["id"]),
         }
         if data:
             fcm_data.update({k: str(v) for k, v in data.items()})
@@ -0,0 +1,139 @@
+from datetime import datetime, timezone
+import asyncio
+import os
+import time
+
+# Seconds without any inbound frame before a connected user is shown offline
+PRESENCE_TTL = float(os.getenv("PRESENCE_TTL", "60"))
+# Cap on ids per lookup or subscription frame
+MAX_PRESENCE_IDS = 200
+
+
+# ── Presence Tracker ────────────────────────────────────────────
+# Built on the ConnectionManager: connect/disconnect and every inbound WS frame
+# feed it. Users are online while connected and heard from within PRESENCE_TTL,
+# which catches half-open sockets that never send a close. Changes are pushed
+# only to users who subscribed to them, instead of clients polling per card.
+
+class PresenceTracker:
+    def __init__(self, ttl: float = PRESENCE_TTL):
+        self.ttl = ttl
+        self.online: set[int] = set()
+        self.last_seen: dict[int, datetime] = {}
+        self._last_heard: dict[int, float] = {}  # monotonic, for expiry
+        self.subscribers: dict[int, set[int]] = {}  # watched user -> watchers
+        self.subscriptions: dict[int, set[int]] = {}  # watcher -> watched users
+        self._task: asyncio.Task | None = None
+        self._pushes: set[asyncio.Task] = set()
+
+    # ── State changes ──
+
+    def connected(self, user_id: int):
+        self.touch(user_id)
+
+    def touch(self, user_id: int):
+        """Record activity from a connected user (any inbound frame counts as a heartbeat)."""
+        self._last_heard[user_id] = time.monotonic()
+        self.last_seen[user_id] = datetime.now(timezone.utc).replace(tzinfo=None)
+        if user_id not in self.online:
+            self.online.add(user_id)
+            self._push_delta(user_id)
+
+    def disconnected(self, user_id: int):
+        self._last_heard.pop(user_id, None)
+        self.unsubscribe(user_id)
+        if user_id in self.online:
+            self.online.discard(user_id)
+            self.last_seen[user_id] = datetime.now(timezone.utc).replace(tzinfo=None)
+            self._push_delta(user_id)
+
+    def expire(self):
+        """Mark users offline whose last frame is older than the TTL."""
+        cutoff = time.monotonic() - self.ttl
+        for user_id in [u for u in self.online if self._last_heard.get(u, 0) < cutoff]:
+            self.online.discard(user_id)
+            self._push_delta(user_id)
+
+    # ── Lookups ──
+
+    def status(self, user_id: int) -> dict:
+        seen = self.last_seen.get(user_id)
+        return {
+            "user_id": user_id,
+            "online": user_id in self.online,
+            "last_seen": seen.isoformat() if seen else None,
+        }
+
+    def snapshot(self, user_ids) -> list[dict]:
+        return [self.status(uid) for uid in user_ids]
+
+    # ── Subscriptions ──
+
+    def subscribe(self, watcher_id: int, user_ids):
+        watched = self.subscriptions.setdefault(watcher_id, set())
+        for uid in user_ids:
+            if len(watched) >= MAX_PRESENCE_IDS:
+                break
+            watched.add(uid)
+            self.subscribers.setdefault(uid, set()).add(watcher_id)
+
+    def unsubscribe(self, watcher_id: int, user_ids=None):
+        """Drop some (or, with no ids, all) of a watcher's subscriptions."""
+        watched = self.subscriptions.get(watcher_id)
+        if not watched:
+            return
+        for uid in list(user_ids if user_ids is not None else watched):
+            watched.discard(uid)
+            watchers = self.subscribers.get(uid)
+            if watchers:
+                watchers.discard(watcher_id)
+                if not watchers:
+                    del self.subscribers[uid]
+        if not watched:
+            del self.subscriptions[watcher_id]
+
+    # ── Delivery ──
+
+    def _push_delta(self, user_id: int):
+        watchers = self.subscribers.get(user_id)
+        if not watchers:
+            return
+        try:
+            task = asyncio.get_running_loop().create_task(
+                self._send_delta(list(watchers), self.status(user_id))
+            )
+        except RuntimeError:
+            return  # no running loop (e.g. called from sync test code)
+        self._pushes.add(task)
+        task.add_done_callback(self._pushes.discard)
+
+    async def _send_delta(self, watcher_ids: list[int], status: dict):
+        # Import here to avoid circular imports
+        from app.routes.messaging import manager
+        outgoing = {"type": "presence", "users": [status]}
+        for watcher_id in watcher_ids:
+            await manager.send_to_user(watcher_id, outgoing)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(min(self.ttl / 2, 15))
+            try:
+                self.expire()
+            except Exception as e:
+                print(f"[PRESENCE] Expiry loop error: {e}")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+presence = PresenceTracker()
@@ -0,0 +1,131 @@
+from sqlalchemy import select, update, bindparam, func
+from app.database import AsyncSessionLocal
+from app.models import conversation_participants, messages
+from collections import defaultdict
+from datetime import datetime
+import asyncio
+import os
+
+FLUSH_INTERVAL = float(os.getenv("READ_RECEIPT_FLUSH_INTERVAL", "1.0"))
+
+
+# ── Read Receipt Buffer ─────────────────────────────────────────
+# Clients fire read markers constantly while scrolling. Instead of one
+# UPDATE + commit per marker, the latest marker per (user, conversation)
+# is kept in memory and written in one batched UPDATE every FLUSH_INTERVAL
+# seconds, on disconnect, and on shutdown.
+
+class ReadReceiptBuffer:
+    def __init__(self, interval: float = FLUSH_INTERVAL):
+        self.interval = interval
+        self.pending: dict[tuple[int, int], datetime] = {}
+        # Markers taken out of `pending` whose UPDATE hasn't committed yet
+        self.flushing: dict[tuple[int, int], datetime] = {}
+        self._task: asyncio.Task | None = None
+
+    def mark(self, user_id: int, conversation_id: int, read_at: datetime):
+        """Record a read marker. Only the newest marker per key is kept."""
+        key = (user_id, conversation_id)
+        prev = self.pending.get(key)
+        if prev is None or read_at > prev:
+            self.pending[key] = read_at
+
+    def get(self, user_id: int, conversation_id: int) -> datetime | None:
+        """Newest read marker not yet visible in the database, if any."""
+        key = (user_id, conversation_id)
+        return self.pending.get(key) or self.flushing.get(key)
+
+    async def flush(self, user_id: int | None = None):
+        """Write buffered markers (all, or one user's) and broadcast receipts."""
+        if user_id is None:
+            batch, self.pending = self.pending, {}
+        else:
+            keys = [k for k in self.pending if k[0] == user_id]
+            batch = {k: self.pending.pop(k) for k in keys}
+        if not batch:
+            return
+        self.flushing.update(batch)
+
+        # Messages from others newer than the marker (usually none) stay unread
+        unread_after = (
+            select(func.count()).select_from(messages).where(
+                messages.c.conversation_id == conversation_participants.c.conversation_id,
+                messages.c.sender_id != conversation_participants.c.user_id,
+                messages.c.created_at > bindparam("b_read_at"),
+            ).scalar_subquery()
+        )
+
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.execute(
+                    update(conversation_participants)
+                    .where(
+                        conversation_participants.c.user_id == bindparam("b_user_id"),
+                        conversation_participants.c.conversation_id == bindparam("b_conversation_id"),
+                    )
+                    .values(last_read_at=bindparam("b_read_at"), unread_count=unread_after),
+                    [
+                        {"b_user_id": uid, "b_conversation_id": cid, "b_read_at": ts}
+                        for (uid, cid), ts in batch.items()
+                    ],
+                )
+                await db.commit()
+
+                result = await db.execute(
+                    select(conversation_participants.c.conversation_id, conversation_participants.c.user_id)
+                    .where(conversation_participants.c.conversation_id.in_({cid for _, cid in batch}))
+                )
+                members = defaultdict(list)
+                for row in result.fetchall():
+                    members[row.conversation_id].append(row.user_id)
+        except Exception as e:
+            # Put markers back so the next flush retries them
+            for (uid, cid), ts in batch.items():
+                self.mark(uid, cid, ts)
+            print(f"[READ] Flush of {len(batch)} read markers failed: {e}")
+            return
+        finally:
+            for key, ts in batch.items():
+                if self.flushing.get(key) == ts:
+                    del self.flushing[key]
+
+        # Broadcast read receipts to the other participants (import here to avoid circular imports)
+        from app.routes.messaging import manager
+        for (uid, cid), ts in batch.items():
+            if uid not in members[cid]:
+                continue
+            outgoing = {
+                "type": "read",
+                "conversation_id": cid,
+                "user_id": uid,
+                "read_at": ts.isoformat(),
+            }
+            for other in members[cid]:
+                if other != uid:
+                    await manager.send_to_user(other, outgoing)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"[READ] Flush loop error: {e}")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Cancel the flush loop and write whatever is still buffered."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+
+read_receipts = ReadReceiptBuffer()
@@ -1,6 +1,7 @@
 from fastapi import Depends, APIRouter, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, insert, update, func
+from sqlalchemy import select, insert, update, func, and_, or_, literal, literal_column, Float
 from app.database import get_db, AsyncSessionLocal
 from app.models import (
     users,
@@ -9,45 +10,206 @@ from app.models import (
     messages,
     quick_pick_sessions,
     notifications,
+    households,
+    MESSAGES_SEARCH_CONFIG,
 )
 from app.deps import get_current_user
 from app.auth import verify_access_token
-from app.notifications import create_notification
+from app.notifications import push_notification
+from app.read_receipts import read_receipts
+from app.message_archive import message_archive
+from app.presence import presence, MAX_PRESENCE_IDS
+from app import ws_protocol
 from datetime import datetime, timezone
-import json
 import asyncio
+import csv
+import io
+import json
+import os
+import random
+import signal
+import threading
+import time
 
 router = APIRouter(tags=["messaging"])
 
+MESSAGE_EVENT_TYPES = ("new_dm_message", "new_group_message")
+MAX_SEARCH_QUERY_LENGTH = 200
+# Rows fetched per round trip from the server-side cursor while exporting
+EXPORT_BATCH_SIZE = 1000
+EXPORT_CSV_COLUMNS = ["id", "conversation_id", "sender_id", "sender_name", "body", "created_at"]
+
 
 # ── Connection Manager ──────────────────────────────────────────
 # In-memory singleton — works for a single server instance.
 # TODO: Replace with Redis pub/sub for multi-instance scaling.
 
+# Server sends {"type": "ping"} this often; clients answer {"type": "pong"} (any frame counts)
+WS_PING_INTERVAL = float(os.getenv("WS_PING_INTERVAL", "25"))
+# Connections that answer pings are evicted after this long without any inbound frame
+WS_IDLE_TIMEOUT = float(os.getenv("WS_IDLE_TIMEOUT", "60"))
+# Outbound frames buffered per connection before it's treated as a stuck consumer
+WS_SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", "256"))
+# On shutdown: time allowed to flush queues, and the spread of client reconnect delays
+WS_DRAIN_TIMEOUT = float(os.getenv("WS_DRAIN_TIMEOUT", "5"))
+WS_RECONNECT_JITTER_MS = int(os.getenv("WS_RECONNECT_JITTER_MS", "10000"))
+
+# Most messages sent in one catch-up frame; clients page the rest with a "catchup" frame
+WS_CATCHUP_LIMIT = int(os.getenv("WS_CATCHUP_LIMIT", "500"))
+
+WS_CLOSE_IDLE = 4002
+WS_CLOSE_SLOW_CONSUMER = 4003
+WS_CLOSE_SERVICE_RESTART = 1012
+
+
+class Connection:
+    """An authenticated socket, the wire codec negotiated for it, and its outbound queue.
+    Sends are enqueued and written by a per-connection task, so one slow client
+    never stalls a fan-out loop."""
+
+    def __init__(self, ws: WebSocket, codec=ws_protocol.JSON):
+        self.ws = ws
+        self.codec = codec
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=WS_SEND_QUEUE_SIZE)
+        self.last_heard = time.monotonic()
+        # Clients that never answered a ping predate heartbeats; they are left to
+        # transport-level keepalive instead of being evicted for being quiet
+        self.answers_pings = False
+        self.closed = False
+        self._writer: asyncio.Task | None = None
+
+    def start(self):
+        self._writer = asyncio.create_task(self._write_loop())
+
+    async def send(self, data: dict):
+        if self.closed:
+            raise ConnectionError("Connection closed")
+        self.queue.put_nowait(data)  # QueueFull -> caller evicts
+
+    async def receive(self) -> dict:
+        try:
+            return await self.codec.receive(self.ws)
+        finally:
+            self.last_heard = time.monotonic()
+
+    async def _write_loop(self):
+        while True:
+            data = await self.queue.get()
+            try:
+                await self.codec.send(self.ws, data)
+            except Exception:
+                self.closed = True
+                return
+            finally:
+                self.queue.task_done()
+
+    async def drain(self, timeout: float):
+        """Wait until queued frames are written (or the timeout passes)."""
+        if self._writer is None or self._writer.done():
+            return
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def close(self, code: int = 1000, reason: str | None = None):
+        if self._writer is not None:
+            self._writer.cancel()
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            await asyncio.wait_for(self.ws.close(code=code, reason=reason), timeout=2.0)
+        except Exception:
+            pass
+
+
 class ConnectionManager:
     def __init__(self):
-        self.active: dict[int, WebSocket] = {}
+        self.active: dict[int, Connection] = {}
+        self.accepting = True
+        self._heartbeat: asyncio.Task | None = None
 
-    async def connect(self, user_id: int, ws: WebSocket):
+    async def connect(self, user_id: int, conn: Connection):
         # Replace previous connection for same user
         old = self.active.get(user_id)
         if old:
+            await old.close()
+        self.active[user_id] = conn
+        conn.start()
+        presence.connected(user_id)
+
+    def disconnect(self, user_id: int, conn: Connection | None = None):
+        """Drop the user's connection. With `conn`, only if it is still the current one,
+        so a replaced socket shutting down doesn't evict its replacement."""
+        if conn is not None and self.active.get(user_id) is not conn:
+            return
+        self.active.pop(user_id, None)
+        presence.disconnected(user_id)
+
+    async def send_to_user(self, user_id: int, data: dict):
+        conn = self.active.get(user_id)
+        if conn:
             try:
-                await old.close()
+                await conn.send(data)
+            except asyncio.QueueFull:
+                self.disconnect(user_id, conn)
+                await conn.close(WS_CLOSE_SLOW_CONSUMER, "Send queue full")
             except Exception:
-                pass
-        self.active[user_id] = ws
+                self.disconnect(user_id, conn)
 
-    def disconnect(self, user_id: int):
-        self.active.pop(user_id, None)
+    # ── Heartbeats ──
 
-    async def send_to_user(self, user_id: int, data: dict):
-        ws = self.active.get(user_id)
-        if ws:
+    async def _heartbeat_loop(self):
+        while True:
+            await asyncio.sleep(WS_PING_INTERVAL)
             try:
-                await ws.send_json(data)
+                await self.heartbeat()
+            except Exception as e:
+                print(f"[WS] Heartbeat error: {e}")
+
+    async def heartbeat(self):
+        """Evict connections silent past the idle timeout and ping the rest."""
+        cutoff = time.monotonic() - WS_IDLE_TIMEOUT
+        for user_id, conn in list(self.active.items()):
+            if conn.closed or (conn.answers_pings and conn.last_heard < cutoff):
+                self.disconnect(user_id, conn)
+                await conn.close(WS_CLOSE_IDLE, "Heartbeat timeout")
+            else:
+                await self.send_to_user(user_id, {"type": "ping"})
+
+    def start(self):
+        if self._heartbeat is None:
+            self._heartbeat = asyncio.create_task(self._heartbeat_loop())
+
+    # ── Graceful drain ──
+
+    async def shutdown(self):
+        """Stop accepting sockets, flush every outbound queue, then close each socket
+        with a jittered reconnect hint so clients don't all reconnect at once."""
+        if not self.accepting:
+            return
+        self.accepting = False
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+            self._heartbeat = None
+
+        async def _drain_and_close(user_id: int, conn: Connection):
+            try:
+                await conn.send(_reconnect_hint())
             except Exception:
-                self.disconnect(user_id)
+                pass
+            await conn.drain(WS_DRAIN_TIMEOUT)
+            self.disconnect(user_id, conn)
+            await conn.close(WS_CLOSE_SERVICE_RESTART, "Server restarting")
+
+        await asyncio.gather(
+            *(_drain_and_close(uid, conn) for uid, conn in list(self.active.items()))
+        )
+
+
+def _reconnect_hint() -> dict:
+    return {"type": "reconnect", "retry_after_ms": random.randint(0, WS_RECONNECT_JITTER_MS)}
 
 
 manager = ConnectionManager()
@@ -84,20 +246,155 @@ async def _get_participant_ids(db: AsyncSession, conversation_id: int) -> list[i
     return [row.user_id for row in result.fetchall()]
 
 
+# Conversation type and household name never change once created, so message
+# notification titles are built from an in-memory cache: conv_id -> (type, household name)
+_conversation_labels: dict[int, tuple[str, str | None]] = {}
+
+
+async def _conversation_label(db: AsyncSession, conversation_id: int) -> tuple[str | None, str | None]:
+    cached = _conversation_labels.get(conversation_id)
+    if cached:
+        return cached
+    result = await db.execute(
+        select(conversations.c.type, households.c.name)
+        .outerjoin(households, households.c.id == conversations.c.household_id)
+        .where(conversations.c.id == conversation_id)
+    )
+    row = result.fetchone()
+    if not row:
+        return None, None
+    if len(_conversation_labels) >= 10_000:
+        _conversation_labels.clear()
+    _conversation_labels[conversation_id] = (row.type, row.name)
+    return row.type, row.name
+
+
+# Strong references to fire-and-forget tasks so they aren't garbage collected mid-run
+_background_tasks: set[asyncio.Task] = set()
+
+
+def _spawn_background(coro):
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+
+async def drain_background_tasks(timeout: float = 5.0):
+    """Give in-flight background work (e.g. message notifications) a chance to finish on shutdown."""
+    if _background_tasks:
+        await asyncio.wait(list(_background_tasks), timeout=timeout)
+
+
+
+def drain_sockets_on_signal():
+    """uvicorn closes every socket (1012) as soon as it starts shutting down, before
+    lifespan shutdown runs. Wrap its SIGINT/SIGTERM handlers so manager.shutdown()
+    drains first, then hand the signal on. A second signal skips straight to uvicorn."""
+    if threading.current_thread() is not threading.main_thread():
+        return
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        original = signal.getsignal(sig)
+        if not callable(original):
+            continue
+
+        def _handler(signum, frame, original=original):
+            if not manager.accepting:
+                original(signum, frame)
+                return
+
+            async def _drain_then_exit():
+                try:
+                    await manager.shutdown()
+                finally:
+                    original(signum, frame)
+
+            loop.call_soon_threadsafe(_spawn_background, _drain_then_exit())
+
+        signal.signal(sig, _handler)
+
+
+async def _store_message(db: AsyncSession, conversation_id: int, sender_id: int, body: str, created_at: datetime):
+    """Insert a message and maintain the conversation's denormalized last-message
+    pointer and the other participants' unread counters. Caller commits."""
+    result = await db.execute(
+        insert(messages).values(
+            conversation_id=conversation_id,
+            sender_id=sender_id,
+            body=body,
+            created_at=created_at,
+        ).returning(messages.c.id, messages.c.created_at)
+    )
+    msg_row = result.fetchone()
+
+    await db.execute(
+        update(conversations)
+        .where(conversations.c.id == conversation_id)
+        .values(last_message_id=msg_row.id, last_message_at=msg_row.created_at)
+    )
+    await db.execute(
+        update(conversation_participants)
+        .where(
+            conversation_participants.c.conversation_id == conversation_id,
+            conversation_participants.c.user_id != sender_id,
+        )
+        .values(unread_count=conversation_participants.c.unread_count + 1)
+    )
+    return msg_row
+
+
+def _message_page_query(conversation_id: int, before: int | None, after: int | None, limit: int):
+    """One page of history as a range scan on ix_messages_conversation_id_id.
+    Fetches limit + 1 rows so callers can tell whether another page exists."""
+    query = select(messages).where(messages.c.conversation_id == conversation_id)
+    if after is not None:
+        return query.where(messages.c.id > after).order_by(messages.c.id.asc()).limit(limit + 1)
+    if before is not None:
+        query = query.where(messages.c.id < before)
+    return query.order_by(messages.c.id.desc()).limit(limit + 1)
+
+
+def _parse_search_cursor(cursor: str) -> tuple[float, int]:
+    """Cursor format is '<rank>,<message id>'."""
+    try:
+        rank, message_id = cursor.split(",", 1)
+        return float(rank), int(message_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _parse_conversation_cursor(cursor: str) -> tuple[datetime, int]:
+    """Cursor format is '<last_activity isoformat>,<conversation id>'."""
+    try:
+        at, conv_id = cursor.rsplit(",", 1)
+        return datetime.fromisoformat(at), int(conv_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
 # ── WebSocket Endpoint ──────────────────────────────────────────
 
 @router.websocket("/ws")
 async def websocket_endpoint(ws: WebSocket):
-    await ws.accept()
+    # JSON text frames unless the client offered the msgpack subprotocol
+    codec = ws_protocol.negotiate(ws)
+    await ws.accept(subprotocol=codec.subprotocol)
+    conn = Connection(ws, codec)
+
+    if not manager.accepting:
+        # Draining for shutdown — tell the client when to come back
+        await codec.send(ws, _reconnect_hint())
+        await ws.close(code=WS_CLOSE_SERVICE_RESTART)
+        return
 
     # Wait for auth frame (5 sec timeout)
     try:
-        raw = await asyncio.wait_for(ws.receive_text(), timeout = 5.0)
-        data = json.loads(raw)
+        data = await asyncio.wait_for(conn.receive(), timeout = 5.0)
         if data.get("type") != "auth" or not data.get("token"):
             await ws.close(code=4001)
             return
-    except (asyncio.TimeoutError, json.JSONDecodeError, WebSocketDisconnect):
+    except (asyncio.TimeoutError, ValueError, KeyError, WebSocketDisconnect):
         await ws.close(code=4001)
         return
     
@@ -116,36 +413,55 @@ async def websocket_endpoint(ws: WebSocket):
             return
         user_id = row.id
 
-    await manager.connect(user_id, ws)
+    await manager.connect(user_id, conn)
+
+    # Reconnecting clients send the newest message id they have; replay what they missed.
+    # Runs after connect so nothing falls in the gap — a message may arrive both live
+    # and in the batch, so clients dedupe by id.
+    if data.get("last_message_id") is not None:
+        await _send_catchup(user_id, data["last_message_id"])
 
     try:
         bad_msg_counter = 0
         while True:
-            raw = await ws.receive_text()
             try:
-                data = json.loads(raw)
-            except json.JSONDecodeError:
+                data = await conn.receive()
+            except (ValueError, KeyError):
+                # Undecodable frame, or a text frame on a binary protocol (and vice versa)
                 bad_msg_counter += 1
                 if bad_msg_counter > 10:
-                    await ws.close()
-                    manager.disconnect(user_id)
+                    await conn.close()
                     break
                 continue
 
             msg_type = data.get("type")
 
             bad_msg_counter = 0
-            if msg_type == "message":
+            presence.touch(user_id)
+            if msg_type == "pong":
+                conn.answers_pings = True
+            elif msg_type == "message":
                 await _handle_ws_message(user_id, data)
             elif msg_type == "typing":
                 await _handle_ws_typing(user_id, data)
             elif msg_type == "read":
                 await _handle_ws_read(user_id, data)
+            elif msg_type == "catchup":
+                await _send_catchup(user_id, data.get("last_message_id"))
+            elif msg_type == "presence_subscribe":
+                await _handle_ws_presence_subscribe(user_id, data)
+            elif msg_type == "presence_unsubscribe":
+                _handle_ws_presence_unsubscribe(user_id, data)
+            # "heartbeat" frames need no handling beyond the liveness/presence touch above
 
     except WebSocketDisconnect:
-        manager.disconnect(user_id)
+        pass
     except Exception:
-        manager.disconnect(user_id)
+        pass
+    finally:
+        manager.disconnect(user_id, conn)
+        await conn.close()
+        await read_receipts.flush(user_id)
 
 
 async def _handle_ws_message(sender_id: int, data: dict):
@@ -162,15 +478,7 @@ async def _handle_ws_message(sender_id: int, data: dict):
 
         # Persist message
         now = datetime.now(timezone.utc).replace(tzinfo=None)
-        result = await db.execute(
-            insert(messages).values(
-                conversation_id=conv_id,
-                sender_id=sender_id,
-                body=body,
-                created_at=now,
-            ).returning(messages.c.id, messages.c.created_at)
-        )
-        msg_row = result.fetchone()
+        msg_row = await _store_message(db, conv_id, sender_id, body, now)
         await db.commit()
 
         # Get sender name for fan-out
@@ -198,78 +506,130 @@ async def _handle_ws_message(sender_id: int, data: dict):
         if uid != sender_id:
             await manager.send_to_user(uid, outgoing)
 
-    # Notify all non-sender participants — upsert per conversation
+    # Notify all non-sender participants — batched upsert in the background so the
+    # sender's next frame isn't blocked on notification writes and pushes
+    recipient_ids = [uid for uid in participant_ids if uid != sender_id]
+    if recipient_ids:
+        _spawn_background(
+            _notify_message_recipients(conv_id, sender_id, sender_name, body, recipient_ids)
+        )
+
+
+async def _notify_message_recipients(
+    conv_id: int, sender_id: int, sender_name: str | None, body: str, recipient_ids: list[int],
+):
+    """Upsert the single per-conversation message notification for every recipient:
+    one UPDATE for recipients that already have one, one multi-row INSERT for the rest."""
     preview = body[:100]
     now = datetime.now(timezone.utc).replace(tzinfo=None)
-    async with AsyncSessionLocal() as notify_db:
-        result = await notify_db.execute(
-            select(conversations.c.type, conversations.c.household_id)
-            .where(conversations.c.id == conv_id)
-        )
-        conv = result.fetchone()
-
-        for uid in participant_ids:
-            if uid != sender_id:
-                if conv and conv.type == "group":
-                    from app.models import households as households_table
-                    result = await notify_db.execute(
-                        select(households_table.c.name)
-                        .where(households_table.c.id == conv.household_id)
-                    )
-                    h_name = result.scalar()
-                    event_type = "new_group_message"
-                    title = f"{sender_name} in {h_name}: {preview}"
-                else:
-                    event_type = "new_dm_message"
-                    title = f"New message from {sender_name}"
-
-                # Upsert: find existing message notification for this conversation
-                result = await notify_db.execute(
-                    select(notifications.c.id).where(
-                        notifications.c.user_id == uid,
-                        notifications.c.event_type.in_(["new_dm_message", "new_group_message"]),
-                        notifications.c.data["conversation_id"].as_integer() == conv_id,
-                    )
+    data = {"conversation_id": conv_id, "user_id": sender_id}
+
+    try:
+        async with AsyncSessionLocal() as db:
+            conv_type, h_name = await _conversation_label(db, conv_id)
+            if conv_type == "group":
+                event_type = "new_group_message"
+                title = f"{sender_name} in {h_name}: {preview}"
+            else:
+                event_type = "new_dm_message"
+                title = f"New message from {sender_name}"
+
+            values = {
+                "event_type": event_type,
+                "actor_id": sender_id,
+                "title": title,
+                "body": preview,
+                "data": data,
+                "read": False,
+                "created_at": now,
+            }
+
+            result = await db.execute(
+                update(notifications)
+                .where(
+                    notifications.c.conversation_id == conv_id,
+                    notifications.c.user_id.in_(recipient_ids),
+                    notifications.c.event_type.in_(MESSAGE_EVENT_TYPES),
                 )
-                existing = result.fetchone()
-
-                if existing:
-                    await notify_db.execute(
-                        update(notifications)
-                        .where(notifications.c.id == existing.id)
-                        .values(
-                            event_type=event_type,
-                            title=title,
-                            body=preview,
-                            actor_id=sender_id,
-                            read=False,
-                            created_at=now,
-                        )
-                    )
-                    await notify_db.commit()
-                    # Push via WebSocket
-                    try:
-                        await manager.send_to_user(uid, {
-                            "type": "notification",
-                            "notification": {
-                                "id": existing.id,
-                                "event_type": event_type,
-                                "actor_id": sender_id,
-                                "title": title,
-                                "body": preview,
-                                "data": {"conversation_id": conv_id, "user_id": sender_id},
-                                "created_at": now.isoformat(),
-                            },
-                        })
-                    except Exception:
-                        pass
-                else:
-                    await create_notification(
-                        notify_db, uid, event_type, sender_id,
-                        title, preview,
-                        {"conversation_id": conv_id, "user_id": sender_id},
-                    )
-                    await notify_db.commit()
+                .values(**values)
+                .returning(notifications.c.id, notifications.c.user_id)
+            )
+            updated = {r.user_id: r.id for r in result.fetchall()}
+
+            inserted = {}
+            missing = [uid for uid in recipient_ids if uid not in updated]
+            if missing:
+                result = await db.execute(
+                    insert(notifications)
+                    .values([{"user_id": uid, "conversation_id": conv_id, **values} for uid in missing])
+                    .returning(notifications.c.id, notifications.c.user_id)
+                )
+                inserted = {r.user_id: r.id for r in result.fetchall()}
+            await db.commit()
+
+            notification = {
+                "event_type": event_type,
+                "actor_id": sender_id,
+                "title": title,
+                "body": preview,
+                "data": data,
+                "created_at": now.isoformat(),
+            }
+            # Refreshed rows were already pushed to devices once; only re-notify over WebSocket
+            for uid, notif_id in updated.items():
+                await manager.send_to_user(uid, {
+                    "type": "notification",
+                    "notification": {"id": notif_id, **notification},
+                })
+            for uid, notif_id in inserted.items():
+                await push_notification(db, uid, {"id": notif_id, **notification})
+            await db.commit()
+    except Exception as e:
+        print(f"[NOTIF] Message notifications failed for conversation {conv_id}: {e}")
+
+
+async def _send_catchup(user_id: int, last_message_id):
+    """Send every message newer than `last_message_id` across the user's conversations
+    as one frame in messages.id order, capped at WS_CATCHUP_LIMIT. With has_more, the
+    client repeats with next_cursor as last_message_id."""
+    if not isinstance(last_message_id, int) or isinstance(last_message_id, bool):
+        return
+
+    async with AsyncSessionLocal() as db:
+        my_conversations = select(conversation_participants.c.conversation_id).where(
+            conversation_participants.c.user_id == user_id
+        )
+        result = await db.execute(
+            select(messages, users.c.name.label("sender_name"), users.c.avatar_url.label("sender_avatar_url"))
+            .join(users, users.c.id == messages.c.sender_id)
+            .where(
+                messages.c.conversation_id.in_(my_conversations),
+                messages.c.id > last_message_id,
+            )
+            .order_by(messages.c.id.asc())
+            .limit(WS_CATCHUP_LIMIT + 1)
+        )
+        rows = result.fetchall()
+
+    has_more = len(rows) > WS_CATCHUP_LIMIT
+    rows = rows[:WS_CATCHUP_LIMIT]
+    await manager.send_to_user(user_id, {
+        "type": "catchup",
+        "messages": [
+            {
+                "id": r.id,
+                "conversation_id": r.conversation_id,
+                "sender_id": r.sender_id,
+                "sender_name": r.sender_name,
+                "sender_avatar_url": r.sender_avatar_url,
+                "body": r.body,
+                "created_at": r.created_at.isoformat() if r.created_at else None,
+            }
+            for r in rows
+        ],
+        "has_more": has_more,
+        "next_cursor": rows[-1].id if has_more else None,
+    })
 
 
 async def _handle_ws_typing(sender_id: int, data: dict):
@@ -303,154 +663,207 @@ async def _handle_ws_read(user_id: int, data: dict):
     if not conv_id:
         return
 
+    # Buffered — written and broadcast in batches by read_receipts
     now = datetime.now(timezone.utc).replace(tzinfo=None)
-    async with AsyncSessionLocal() as db:
-        await db.execute(
-            update(conversation_participants)
-            .where(
-                conversation_participants.c.conversation_id == conv_id,
-                conversation_participants.c.user_id == user_id,
-            )
-            .values(last_read_at=now)
-        )
-        await db.commit()
+    read_receipts.mark(user_id, conv_id, now)
+
+
+async def _handle_ws_presence_subscribe(user_id: int, data: dict):
+    user_ids = _parse_user_ids(data.get("user_ids"))
+    if not user_ids:
+        return
+    presence.subscribe(user_id, user_ids)
+    await manager.send_to_user(user_id, {
+        "type": "presence",
+        "users": presence.snapshot(user_ids),
+    })
+
+
+def _handle_ws_presence_unsubscribe(user_id: int, data: dict):
+    # No user_ids clears every subscription
+    presence.unsubscribe(user_id, _parse_user_ids(data.get("user_ids")) or None)
+
+
+def _parse_user_ids(value) -> list[int]:
+    if not isinstance(value, list):
+        return []
+    return [v for v in value if isinstance(v, int)][:MAX_PRESENCE_IDS]
 
 
 # ── REST Endpoints ──────────────────────────────────────────────
 
 @router.get("/conversations")
 async def list_conversations(
+    cursor: str | None = None,
+    limit: int = 50,
     payload: dict = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
-    """List user's conversations with last message and unread count."""
+    """List user's conversations with last message and unread count, newest activity first.
+    Keyset-paginated by last activity; pass `next_cursor` back as `cursor` for the next page."""
     me = await _resolve_user_id(db, payload)
 
-    # Get all conversation IDs for this user
-    result = await db.execute(
-        select(conversation_participants.c.conversation_id, conversation_participants.c.last_read_at)
-        .where(conversation_participants.c.user_id == me)
+    # Page of my conversations, sorted and limited in SQL
+    last_activity = func.coalesce(conversations.c.last_message_at, conversations.c.created_at)
+    page_query = (
+        select(
+            conversations.c.id,
+            conversations.c.type,
+            conversations.c.household_id,
+            conversations.c.last_message_id,
+            conversations.c.last_message_at,
+            last_activity.label("last_activity"),
+            conversation_participants.c.last_read_at,
+            conversation_participants.c.unread_count,
+        )
+        .join(
+            conversation_participants,
+            and_(
+                conversation_participants.c.conversation_id == conversations.c.id,
+                conversation_participants.c.user_id == me,
+            ),
+        )
+    )
+    if cursor is not None:
+        cursor_at, cursor_id = _parse_conversation_cursor(cursor)
+        page_query = page_query.where(
+            or_(
+                last_activity < cursor_at,
+                and_(last_activity == cursor_at, conversations.c.id < cursor_id),
+            )
+        )
+    page = (
+        page_query
+        .order_by(last_activity.desc(), conversations.c.id.desc())
+        .limit(limit + 1)
+        .subquery("page")
     )
-    my_participations = {row.conversation_id: row.last_read_at for row in result.fetchall()}
-
-    if not my_participations:
-        return {"conversations": []}
-
-    conv_ids = list(my_participations.keys())
 
-    # Fetch conversation rows
+    # One joined query: page + last message + its sender + all participants
+    member = conversation_participants.alias("member")
+    member_user = users.alias("member_user")
+    last_sender = users.alias("last_sender")
     result = await db.execute(
-        select(conversations).where(conversations.c.id.in_(conv_ids))
+        select(
+            page,
+            messages.c.body.label("last_body"),
+            messages.c.created_at.label("last_created_at"),
+            last_sender.c.name.label("last_sender_name"),
+            member.c.user_id.label("member_id"),
+            member_user.c.name.label("member_name"),
+            member_user.c.avatar_url.label("member_avatar_url"),
+        )
+        .select_from(page)
+        .outerjoin(messages, messages.c.id == page.c.last_message_id)
+        .outerjoin(last_sender, last_sender.c.id == messages.c.sender_id)
+        .join(member, member.c.conversation_id == page.c.id)
+        .join(member_user, member_user.c.id == member.c.user_id)
+        .order_by(page.c.last_activity.desc(), page.c.id.desc(), member.c.id)
     )
-    conv_rows = {c.id: c for c in result.fetchall()}
 
     items = []
-    for conv_id in conv_ids:
-        conv = conv_rows.get(conv_id)
-        if not conv:
-            continue
-
-        # Last message
-        result = await db.execute(
-            select(messages)
-            .where(messages.c.conversation_id == conv_id)
-            .order_by(messages.c.id.desc())
-            .limit(1)
+    by_id = {}
+    for r in result.fetchall():
+        item = by_id.get(r.id)
+        if item is None:
+            last_message = None
+            if r.last_body is not None:
+                last_message = {
+                    "body": r.last_body,
+                    "sender_name": r.last_sender_name,
+                    "created_at": r.last_created_at.isoformat() if r.last_created_at else None,
+                }
+            item = {
+                "id": r.id,
+                "type": r.type,
+                "household_id": r.household_id,
+                "participants": [],
+                "last_message": last_message,
+                "unread_count": r.unread_count,
+                "_last_activity": r.last_activity,
+                "_last_message_at": r.last_message_at,
+                "_last_read_at": r.last_read_at,
+            }
+            by_id[r.id] = item
+            items.append(item)
+        item["participants"].append(
+            {"id": r.member_id, "name": r.member_name, "avatar_url": r.member_avatar_url}
         )
-        last_msg = result.fetchone()
 
-        # Unread count
-        last_read = my_participations[conv_id]
-        if last_read:
-            result = await db.execute(
-                select(func.count()).select_from(messages).where(
-                    messages.c.conversation_id == conv_id,
-                    messages.c.created_at > last_read,
-                    messages.c.sender_id != me,
-                )
-            )
-        else:
-            result = await db.execute(
-                select(func.count()).select_from(messages).where(
-                    messages.c.conversation_id == conv_id,
-                    messages.c.sender_id != me,
+    has_more = len(items) > limit
+    items = items[:limit]
+
+    for item in items:
+        # A buffered read marker may be newer than the stored counter
+        pending_read = read_receipts.get(me, item["id"])
+        last_read = item.pop("_last_read_at")
+        last_message_at = item.pop("_last_message_at")
+        if pending_read and (last_read is None or pending_read > last_read):
+            if last_message_at is None or last_message_at <= pending_read:
+                item["unread_count"] = 0
+            else:
+                result = await db.execute(
+                    select(func.count()).select_from(messages).where(
+                        messages.c.conversation_id == item["id"],
+                        messages.c.created_at > pending_read,
+                        messages.c.sender_id != me,
+                    )
                 )
-            )
-        unread_count = result.scalar() or 0
+                item["unread_count"] = result.scalar() or 0
 
-        # Participants info
-        result = await db.execute(
-            select(
-                conversation_participants.c.user_id,
-                users.c.name,
-                users.c.avatar_url,
-            )
-            .join(users, users.c.id == conversation_participants.c.user_id)
-            .where(conversation_participants.c.conversation_id == conv_id)
-        )
-        participants = [
-            {"id": r.user_id, "name": r.name, "avatar_url": r.avatar_url}
-            for r in result.fetchall()
-        ]
-
-        # Last message sender name
-        last_message = None
-        if last_msg:
-            sender_name = None
-            for p in participants:
-                if p["id"] == last_msg.sender_id:
-                    sender_name = p["name"]
-                    break
-            last_message = {
-                "body": last_msg.body,
-                "sender_name": sender_name,
-                "created_at": last_msg.created_at.isoformat() if last_msg.created_at else None,
-            }
+    next_cursor = None
+    if has_more and items:
+        next_cursor = f"{items[-1]['_last_activity'].isoformat()},{items[-1]['id']}"
+    for item in items:
+        item.pop("_last_activity")
 
-        items.append({
-            "id": conv.id,
-            "type": conv.type,
-            "household_id": conv.household_id,
-            "participants": participants,
-            "last_message": last_message,
-            "unread_count": unread_count,
-        })
-
-    # Sort by last message time descending (conversations with messages first)
-    items.sort(
-        key=lambda c: c["last_message"]["created_at"] if c["last_message"] else "",
-        reverse=True,
-    )
-
-    return {"conversations": items}
+    return {"conversations": items, "has_more": has_more, "next_cursor": next_cursor}
 
 
 @router.get("/conversations/{conversation_id}/messages")
 async def get_messages(
     conversation_id: int,
     before: int | None = None,
+    after: int | None = None,
     limit: int = 50,
     payload: dict = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
-    """Cursor-paginated message history. Ordered by created_at ASC."""
+    """Keyset-paginated message history, returned in ASC order.
+    `before` pages backward (older), `after` pages forward (newer); neither returns the latest page.
+    `next_cursor` is the id to pass as the same parameter to continue in that direction."""
     me = await _resolve_user_id(db, payload)
 
+    if before is not None and after is not None:
+        raise HTTPException(status_code=400, detail="Use either before or after, not both")
+
     # Verify participant
     participant_ids = await _get_participant_ids(db, conversation_id)
     if me not in participant_ids:
         raise HTTPException(status_code=403, detail="Not a participant")
 
-    query = select(messages).where(messages.c.conversation_id == conversation_id)
-    if before is not None:
-        query = query.where(messages.c.id < before)
-
-    query = query.order_by(messages.c.id.desc()).limit(limit)
-    result = await db.execute(query)
+    result = await db.execute(_message_page_query(conversation_id, before, after, limit))
     rows = result.fetchall()
 
-    # Reverse to ASC order for display
-    rows = list(reversed(rows))
+    # Archived history is older than every live row: forward pages start with it,
+    # backward pages continue into it once the live rows run out
+    if after is not None:
+        archived = await message_archive.read(db, conversation_id, after=after, limit=limit + 1)
+        if archived:
+            rows = (archived + rows)[:limit + 1]
+    elif len(rows) <= limit:
+        oldest = rows[-1].id if rows else before
+        rows += await message_archive.read(db, conversation_id, before=oldest, limit=limit + 1 - len(rows))
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if after is None:
+        # Backward pages are fetched newest-first; reverse to ASC order for display
+        rows = list(reversed(rows))
+
+    next_cursor = None
+    if has_more and rows:
+        next_cursor = rows[-1].id if after is not None else rows[0].id
 
     # Batch-fetch sender info
     sender_ids = list({r.sender_id for r in rows})
@@ -476,7 +889,186 @@ async def get_messages(
             "created_at": r.created_at.isoformat() if r.created_at else None,
         })
 
-    return {"messages": msgs}
+    return {"messages": msgs, "has_more": has_more, "next_cursor": next_cursor}
+
+
+async def _export_rows(conversation_id: int):
+    """Yield a conversation's messages oldest first: archived segments, then live rows
+    EXPORT_BATCH_SIZE at a time from a server-side cursor, so memory stays flat
+    however long the history is."""
+    # Own session: the request's session is closed once the endpoint returns,
+    # before the response body has streamed
+    async with AsyncSessionLocal() as db:
+        async for batch in message_archive.iter_segments(db, conversation_id):
+            result = await db.execute(
+                select(users.c.id, users.c.name).where(users.c.id.in_({r.sender_id for r in batch}))
+            )
+            names = dict(result.fetchall())
+            yield [r._replace(sender_name=names.get(r.sender_id)) for r in batch]
+
+        result = await db.stream(
+            select(
+                messages.c.id,
+                messages.c.conversation_id,
+                messages.c.sender_id,
+                users.c.name.label("sender_name"),
+                messages.c.body,
+                messages.c.created_at,
+            )
+            .join(users, users.c.id == messages.c.sender_id)
+            .where(messages.c.conversation_id == conversation_id)
+            .order_by(messages.c.id.asc())
+            .execution_options(yield_per=EXPORT_BATCH_SIZE)
+        )
+        async for batch in result.partitions():
+            yield batch
+
+
+async def _export_ndjson(conversation_id: int):
+    async for batch in _export_rows(conversation_id):
+        yield "".join(
+            json.dumps({
+                "id": r.id,
+                "conversation_id": r.conversation_id,
+                "sender_id": r.sender_id,
+                "sender_name": r.sender_name,
+                "body": r.body,
+                "created_at": r.created_at.isoformat() if r.created_at else None,
+            }, ensure_ascii=False) + "\n"
+            for r in batch
+        )
+
+
+async def _export_csv(conversation_id: int):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_CSV_COLUMNS)
+    async for batch in _export_rows(conversation_id):
+        for r in batch:
+            writer.writerow([
+                r.id, r.conversation_id, r.sender_id, r.sender_name, r.body,
+                r.created_at.isoformat() if r.created_at else "",
+            ])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+@router.get("/conversations/{conversation_id}/export")
+async def export_conversation(
+    conversation_id: int,
+    format: str = "ndjson",
+    payload: dict = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """Stream a conversation's full history as NDJSON (default) or CSV."""
+    me = await _resolve_user_id(db, payload)
+
+    if format not in ("ndjson", "csv"):
+        raise HTTPException(status_code=400, detail="Format must be ndjson or csv")
+
+    participant_ids = await _get_participant_ids(db, conversation_id)
+    if me not in participant_ids:
+        raise HTTPException(status_code=403, detail="Not a participant")
+
+    if format == "csv":
+        body, media_type = _export_csv(conversation_id), "text/csv; charset=utf-8"
+    else:
+        body, media_type = _export_ndjson(conversation_id), "application/x-ndjson"
+    filename = f"conversation-{conversation_id}.{format}"
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@router.get("/messages/search")
+async def search_messages(
+    q: str,
+    conversation_id: int | None = None,
+    cursor: str | None = None,
+    limit: int = 20,
+    payload: dict = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """Full-text search over messages in the caller's conversations (or one of them).
+    Hits are ranked by relevance, then newest first; pass next_cursor as cursor for the next page."""
+    me = await _resolve_user_id(db, payload)
+
+    q = q.strip()
+    if not q or len(q) > MAX_SEARCH_QUERY_LENGTH:
+        raise HTTPException(status_code=400, detail="Invalid search query")
+    limit = max(1, min(limit, 50))
+
+    if conversation_id is not None:
+        participant_ids = await _get_participant_ids(db, conversation_id)
+        if me not in participant_ids:
+            raise HTTPException(status_code=403, detail="Not a participant")
+        scope = messages.c.conversation_id == conversation_id
+    else:
+        scope = messages.c.conversation_id.in_(
+            select(conversation_participants.c.conversation_id)
+            .where(conversation_participants.c.user_id == me)
+        )
+
+    if db.get_bind().dialect.name == "postgresql":
+        # GIN index scan on the generated body_tsv column
+        body_tsv = literal_column("messages.body_tsv")
+        tsquery = func.websearch_to_tsquery(MESSAGES_SEARCH_CONFIG, q)
+        match = body_tsv.op("@@")(tsquery)
+        rank = func.ts_rank(body_tsv, tsquery)
+    else:
+        # No tsvector elsewhere (e.g. SQLite in tests): substring match, newest first
+        escaped = q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        match = messages.c.body.ilike(f"%{escaped}%", escape="\\")
+        rank = literal(0.0, Float)
+
+    query = (
+        select(
+            messages.c.id,
+            messages.c.conversation_id,
+            messages.c.sender_id,
+            messages.c.body,
+            messages.c.created_at,
+            rank.label("rank"),
+            users.c.name.label("sender_name"),
+            users.c.avatar_url.label("sender_avatar_url"),
+        )
+        .join(users, users.c.id == messages.c.sender_id)
+        .where(scope, match)
+    )
+    if cursor:
+        cursor_rank, cursor_id = _parse_search_cursor(cursor)
+        query = query.where(or_(
+            rank < cursor_rank,
+            and_(rank == cursor_rank, messages.c.id < cursor_id),
+        ))
+    result = await db.execute(
+        query.order_by(rank.desc(), messages.c.id.desc()).limit(limit + 1)
+    )
+    rows = result.fetchall()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = f"{rows[-1].rank!r},{rows[-1].id}" if has_more else None
+
+    hits = [
+        {
+            "id": r.id,
+            "conversation_id": r.conversation_id,
+            "sender_id": r.sender_id,
+            "sender_name": r.sender_name,
+            "sender_avatar_url": r.sender_avatar_url,
+            "body": r.body,
+            "created_at": r.created_at.isoformat() if r.created_at else None,
+            "rank": r.rank,
+        }
+        for r in rows
+    ]
+    return {"results": hits, "has_more": has_more, "next_cursor": next_cursor}
 
 
 @router.post("/conversations/dm/{user_id}")
@@ -563,21 +1155,18 @@ async def mark_read(
     payload: dict = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
-    """Mark conversation as read for current user."""
+    """Mark conversation as read for current user. The write is buffered and flushed in batches."""
     me = await _resolve_user_id(db, payload)
 
-    now = datetime.now(timezone.utc).replace(tzinfo=None)
     result = await db.execute(
-        update(conversation_participants)
-        .where(
+        select(conversation_participants.c.id).where(
             conversation_participants.c.conversation_id == conversation_id,
             conversation_participants.c.user_id == me,
         )
-        .values(last_read_at=now)
     )
-
-    if result.rowcount == 0:
+    if not result.fetchone():
         raise HTTPException(status_code=403, detail="Not a participant")
 
-    await db.commit()
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    read_receipts.mark(me, conversation_id, now)
     return {"detail": "Marked as read"}
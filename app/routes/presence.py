@@ -0,0 +1,56 @@
+from fastapi import Depends, APIRouter, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+from app.database import get_db
+from app.models import users, conversation_participants
+from app.deps import get_current_user
+from app.presence import presence, MAX_PRESENCE_IDS
+
+router = APIRouter(prefix="/presence", tags=["presence"])
+
+# ── Helpers ──────────────────────────────────────────────────────
+
+async def _resolve_user_id(db: AsyncSession, payload: dict) -> int:
+    email = payload["email"]
+    result = await db.execute(select(users.c.id).where(users.c.email == email))
+    row = result.fetchone()
+    if not row:
+        raise HTTPException(status_code=404, detail="User not found")
+    return row.id
+
+# ── Batched Lookups ──────────────────────────────────────────────
+
+@router.get("/")
+async def get_presence(
+    user_ids: str,
+    payload: dict = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """Online status and last-seen for a comma-separated list of user ids (e.g. a neighbor list).
+    Served from memory; for live updates, send a `presence_subscribe` frame over the WebSocket."""
+    await _resolve_user_id(db, payload)
+    try:
+        ids = [int(x) for x in user_ids.split(",") if x.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="user_ids must be comma-separated integers")
+    if len(ids) > MAX_PRESENCE_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_PRESENCE_IDS} user ids per request")
+    return {"users": presence.snapshot(dict.fromkeys(ids))}
+
+
+@router.get("/conversations/{conversation_id}")
+async def get_conversation_presence(
+    conversation_id: int,
+    payload: dict = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """Online status and last-seen for every participant of a conversation."""
+    me = await _resolve_user_id(db, payload)
+    result = await db.execute(
+        select(conversation_participants.c.user_id)
+        .where(conversation_participants.c.conversation_id == conversation_id)
+    )
+    participant_ids = [row.user_id for row in result.fetchall()]
+    if me not in participant_ids:
+        raise HTTPException(status_code=403, detail="Not a participant")
+    return {"users": presence.snapshot(participant_ids)}
@@ -575,8 +575,7 @@ async def test_create_household_neg(client):
 @pytest.mark.asyncio
 async def test_messaging(client):
     print("--------------------------MESSAGING TESTS--------------------------")
-    from sqlalchemy import insert as sa_insert
-    from app.models import messages as messages_table
+    from app.routes.messaging import _store_message
     from datetime import datetime, timezone, timedelta
 
     # ── DM Creation ──
@@ -669,7 +668,7 @@ async def test_messaging(client):
     assert response.status_code == 403
 
     # ── Insert Messages Directly & Test Retrieval ──
-    print("15. Insert 5 messages into DM via TestSessionLocal")
+    print("15. Insert 5 messages into DM via TestSessionLocal (through the shared store helper)")
     # Offset message timestamps 10s in the past so mark_read (which uses now())
     # is always after all messages — avoids millisecond race in back-to-back test calls
     base_time = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(seconds=10)
@@ -677,15 +676,11 @@ async def test_messaging(client):
     async with TestSessionLocal() as db:
         for i in range(5):
             sender = state["user_idA"] if i % 2 == 0 else state["user_idB"]
-            result = await db.execute(
-                sa_insert(messages_table).values(
-                    conversation_id=state["dm_conv_id"],
-                    sender_id=sender,
-                    body=f"Test message {i+1}",
-                    created_at=base_time + timedelta(seconds=i),
-                ).returning(messages_table.c.id)
+            row = await _store_message(
+                db, state["dm_conv_id"], sender, f"Test message {i+1}",
+                base_time + timedelta(seconds=i),
             )
-            msg_ids.append(result.scalar_one())
+            msg_ids.append(row.id)
         await db.commit()
 
     print("16. GET Messages — should return all 5 in ASC order")
@@ -757,6 +752,186 @@ async def test_messaging(client):
     print("25. Last message in conversation list should be 'Test message 5'")
     assert dm["last_message"]["body"] == "Test message 5"
 
+    # ── Buffered Read Receipts ──
+    print("26. Flush buffered read markers — last_read_at persisted for B")
+    from sqlalchemy import select as sa_select
+    from app.models import conversation_participants as participants_table
+    from app.read_receipts import read_receipts
+    assert read_receipts.get(state["user_idB"], state["dm_conv_id"]) is not None
+    await read_receipts.flush()
+    assert read_receipts.get(state["user_idB"], state["dm_conv_id"]) is None
+    async with TestSessionLocal() as db:
+        result = await db.execute(
+            sa_select(participants_table.c.last_read_at).where(
+                participants_table.c.conversation_id == state["dm_conv_id"],
+                participants_table.c.user_id == state["user_idB"],
+            )
+        )
+        assert result.scalar() is not None
+    response = await client.get("/conversations", headers=state["headers_B"])
+    dm = next(c for c in response.json()["conversations"] if c["type"] == "dm")
+    assert dm["unread_count"] == 0
+
+    print("27. GET Conversations paginated by last activity (limit=1, then cursor)")
+    response = await client.get("/conversations?limit=1", headers=state["headers_A"])
+    assert response.status_code == 200
+    data = response.json()
+    assert len(data["conversations"]) == 1
+    assert data["has_more"] == True
+    first_id = data["conversations"][0]["id"]
+    response = await client.get(
+        "/conversations", params={"limit": 1, "cursor": data["next_cursor"]}, headers=state["headers_A"]
+    )
+    data = response.json()
+    assert len(data["conversations"]) == 1
+    assert {first_id, data["conversations"][0]["id"]} == {state["dm_conv_id"], state["group_conv_id"]}
+    assert data["has_more"] == False
+    assert data["next_cursor"] is None
+
+    print("28. Negative: malformed cursor should return 400")
+    response = await client.get("/conversations?cursor=garbage", headers=state["headers_A"])
+    assert response.status_code == 400
+
+    # ── Keyset Message History ──
+    print("29. GET Messages backward with limit=2 — has_more and next_cursor point at older page")
+    response = await client.get(
+        f"/conversations/{state['dm_conv_id']}/messages?limit=2", headers=state["headers_A"]
+    )
+    data = response.json()
+    assert data["has_more"] == True
+    assert data["next_cursor"] == msg_ids[3]
+    response = await client.get(
+        f"/conversations/{state['dm_conv_id']}/messages?limit=2&before={data['next_cursor']}",
+        headers=state["headers_A"]
+    )
+    assert [m["id"] for m in response.json()["messages"]] == msg_ids[1:3]
+
+    print("30. GET Messages forward (?after=msg2&limit=2 should return msg3, msg4)")
+    response = await client.get(
+        f"/conversations/{state['dm_conv_id']}/messages?after={msg_ids[1]}&limit=2",
+        headers=state["headers_A"]
+    )
+    data = response.json()
+    assert [m["body"] for m in data["messages"]] == ["Test message 3", "Test message 4"]
+    assert data["has_more"] == True
+    response = await client.get(
+        f"/conversations/{state['dm_conv_id']}/messages?after={data['next_cursor']}&limit=2",
+        headers=state["headers_A"]
+    )
+    data = response.json()
+    assert [m["body"] for m in data["messages"]] == ["Test message 5"]
+    assert data["has_more"] == False
+    assert data["next_cursor"] is None
+
+    print("31. Negative: before and after together should return 400")
+    response = await client.get(
+        f"/conversations/{state['dm_conv_id']}/messages?after=1&before=5", headers=state["headers_A"]
+    )
+    assert response.status_code == 400
+
+    # ── Message Notifications ──
+    print("32. Message notifications upsert one row per (recipient, conversation)")
+    from app.routes.messaging import _notify_message_recipients
+    from app.models import notifications as notifications_table
+    await _notify_message_recipients(state["dm_conv_id"], state["user_idA"], "Maksym", "first", [state["user_idB"]])
+    await _notify_message_recipients(state["dm_conv_id"], state["user_idA"], "Maksym", "second", [state["user_idB"]])
+    async with TestSessionLocal() as db:
+        result = await db.execute(
+            sa_select(notifications_table.c.body, notifications_table.c.event_type).where(
+                notifications_table.c.user_id == state["user_idB"],
+                notifications_table.c.conversation_id == state["dm_conv_id"],
+            )
+        )
+        rows = result.fetchall()
+    assert len(rows) == 1
+    assert rows[0].body == "second"
+    assert rows[0].event_type == "new_dm_message"
+
+    print("33. WS catch-up replays newer messages across conversations in id order")
+    from app.routes.messaging import manager, Connection, _send_catchup
+
+    class FakeSocket:
+        def __init__(self):
+            self.sent = []
+
+        async def send_text(self, text):
+            self.sent.append(json.loads(text))
+
+        async def close(self, code=1000, reason=None):
+            pass
+
+    response = await client.get(f"/conversations/{state['dm_conv_id']}/messages?limit=100", headers=state["headers_B"])
+    dm_ids = [m["id"] for m in response.json()["messages"]]
+    ws_b = FakeSocket()
+    conn_b = Connection(ws_b)
+    await manager.connect(state["user_idB"], conn_b)
+    await _send_catchup(state["user_idB"], dm_ids[0])
+    await conn_b.drain(1)
+    frame = ws_b.sent[-1]
+    assert frame["type"] == "catchup"
+    ids = [m["id"] for m in frame["messages"]]
+    assert ids == sorted(ids) and all(i > dm_ids[0] for i in ids)
+    assert set(dm_ids[1:]) <= set(ids)
+    assert frame["has_more"] == False
+    manager.disconnect(state["user_idB"], conn_b)
+    await conn_b.close()
+
+    print("34. Search DM messages, ranked and paged with the cursor")
+    seen = []
+    cursor = None
+    while True:
+        url = f"/messages/search?q=message&conversation_id={state['dm_conv_id']}&limit=2"
+        if cursor:
+            url += f"&cursor={cursor}"
+        response = await client.get(url, headers=state["headers_B"])
+        assert response.status_code == 200
+        data = response.json()
+        assert len(data["results"]) <= 2
+        seen += [r["id"] for r in data["results"]]
+        cursor = data["next_cursor"]
+        if not data["has_more"]:
+            break
+    assert len(seen) == len(set(seen))
+    assert {f"Test message {i}" for i in range(1, 6)} <= {
+        m["body"] for m in (await client.get(
+            f"/messages/search?q=message&conversation_id={state['dm_conv_id']}&limit=50", headers=state["headers_B"]
+        )).json()["results"]
+    }
+
+    print("35. Search across all of B's conversations; no match returns nothing")
+    response = await client.get("/messages/search?q=message", headers=state["headers_B"])
+    assert set(seen) <= {r["id"] for r in response.json()["results"]} or response.json()["has_more"]
+    response = await client.get("/messages/search?q=zzzqqxnotaword", headers=state["headers_B"])
+    assert response.json()["results"] == []
+
+    print("36. Negative: search outside own conversations, empty query, bad cursor")
+    response = await client.get(f"/messages/search?q=message&conversation_id={state['dm_conv_id']}", headers=state["headers_C"])
+    assert response.status_code == 403
+    response = await client.get("/messages/search?q=%20", headers=state["headers_B"])
+    assert response.status_code == 400
+    response = await client.get("/messages/search?q=message&cursor=junk", headers=state["headers_B"])
+    assert response.status_code == 400
+
+    print("37. Export DM history as NDJSON and CSV")
+    response = await client.get(f"/conversations/{state['dm_conv_id']}/messages?limit=100", headers=state["headers_B"])
+    dm_ids = [m["id"] for m in response.json()["messages"]]
+    response = await client.get(f"/conversations/{state['dm_conv_id']}/export", headers=state["headers_B"])
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [m["id"] for m in lines] == dm_ids
+    response = await client.get(f"/conversations/{state['dm_conv_id']}/export?format=csv", headers=state["headers_B"])
+    assert response.status_code == 200
+    rows = response.text.splitlines()
+    assert rows[0] == "id,conversation_id,sender_id,sender_name,body,created_at"
+    assert len(rows) == len(dm_ids) + 1
+
+    print("38. Negative: export by non-participant or in an unknown format")
+    response = await client.get(f"/conversations/{state['dm_conv_id']}/export", headers=state["headers_C"])
+    assert response.status_code == 403
+    response = await client.get(f"/conversations/{state['dm_conv_id']}/export?format=xml", headers=state["headers_B"])
+    assert response.status_code == 400
+
 
 @pytest.mark.asyncio
 async def test_notifications(client):
@@ -852,3 +1027,146 @@ async def test_notifications(client):
     assert response.status_code == 200
     assert response.json()["notifications"] == []
     assert response.json()["unread_count"] == 0
+
+
+@pytest.mark.asyncio
+async def test_presence(client):
+    print("--------------------------PRESENCE TESTS--------------------------")
+    from app.presence import presence
+
+    print("1. GET Presence for A and B (nobody connected over WS)")
+    response = await client.get(
+        f"/presence/?user_ids={state['user_idA']},{state['user_idB']}", headers=state["headers_C"]
+    )
+    assert response.status_code == 200
+    users = response.json()["users"]
+    assert [u["user_id"] for u in users] == [state["user_idA"], state["user_idB"]]
+    assert all(u["online"] == False for u in users)
+
+    print("2. A connects — batched lookup for the DM shows A online")
+    presence.connected(state["user_idA"])
+    response = await client.get(f"/presence/conversations/{state['dm_conv_id']}", headers=state["headers_B"])
+    assert response.status_code == 200
+    by_id = {u["user_id"]: u for u in response.json()["users"]}
+    assert by_id[state["user_idA"]]["online"] == True
+    assert by_id[state["user_idB"]]["online"] == False
+
+    print("3. A silent past the TTL — expired to offline with last_seen kept")
+    presence._last_heard[state["user_idA"]] -= presence.ttl + 1
+    presence.expire()
+    status = presence.status(state["user_idA"])
+    assert status["online"] == False
+    assert status["last_seen"] is not None
+    presence.disconnected(state["user_idA"])
+
+    print("4. Negative: non-participant can't read conversation presence")
+    response = await client.get(f"/presence/conversations/{state['dm_conv_id']}", headers=state["headers_C"])
+    assert response.status_code == 403
+
+    print("5. Negative: malformed user_ids should return 400")
+    response = await client.get("/presence/?user_ids=1,x", headers=state["headers_A"])
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_ws_heartbeat(client):
+    print("--------------------------WS HEARTBEAT TESTS--------------------------")
+    from app.routes.messaging import ConnectionManager, Connection
+
+    class FakeSocket:
+        def __init__(self):
+            self.sent, self.close_code = [], None
+
+        async def send_text(self, text):
+            self.sent.append(json.loads(text))
+
+        async def close(self, code=1000, reason=None):
+            self.close_code = code
+
+    mgr = ConnectionManager()
+    ws_a, ws_b = FakeSocket(), FakeSocket()
+    conn_a, conn_b = Connection(ws_a), Connection(ws_b)
+    await mgr.connect(state["user_idA"], conn_a)
+    await mgr.connect(state["user_idB"], conn_b)
+
+    print("1. Heartbeat pings every connection")
+    await mgr.heartbeat()
+    await conn_a.drain(1)
+    await conn_b.drain(1)
+    assert ws_a.sent == [{"type": "ping"}] and ws_b.sent == [{"type": "ping"}]
+
+    print("2. A answers pings then goes silent past the idle timeout — evicted; B never answered — kept")
+    conn_a.answers_pings = True
+    conn_a.last_heard -= 3600
+    conn_b.last_heard -= 3600
+    await mgr.heartbeat()
+    assert state["user_idA"] not in mgr.active
+    assert ws_a.close_code == 4002
+    assert state["user_idB"] in mgr.active
+
+    print("3. Shutdown flushes queued frames, sends a reconnect hint and closes with 1012")
+    await mgr.send_to_user(state["user_idB"], {"type": "typing", "conversation_id": 1})
+    await mgr.shutdown()
+    assert ws_b.sent[-2] == {"type": "typing", "conversation_id": 1}
+    assert ws_b.sent[-1]["type"] == "reconnect"
+    assert ws_b.close_code == 1012
+    assert mgr.active == {} and mgr.accepting == False
+
+
+@pytest.mark.asyncio
+async def test_message_archive(client, tmp_path):
+    print("--------------------------MESSAGE ARCHIVE TESTS--------------------------")
+    if engine.dialect.name != "postgresql":
+        pytest.skip("messages is only partitioned on Postgres")
+    from sqlalchemy import text
+    from datetime import datetime, timedelta
+    from app.message_archive import message_archive
+    from app.models import MESSAGES_PARTITION_SIZE
+
+    response = await client.get(f"/conversations/{state['dm_conv_id']}/messages?limit=100", headers=state["headers_B"])
+    before_ids = [m["id"] for m in response.json()["messages"]]
+
+    print("1. Ids move past the first partition — the next ones are created ahead")
+    async with engine.begin() as conn:
+        await conn.execute(text("SELECT setval('messages_id_seq', :v)"), {"v": MESSAGES_PARTITION_SIZE + 10})
+        await message_archive.ensure_partitions(conn)
+        parts = await message_archive.partitions(conn)
+    assert [p.name for p in parts][:2] == ["messages_p0", f"messages_p{MESSAGES_PARTITION_SIZE}"]
+
+    print("2. Archive the first partition to compressed files")
+    # End the shared request session's transaction so DETACH can take its lock
+    async for session in app.dependency_overrides[get_db]():
+        await session.commit()
+    message_archive.archive_dir = str(tmp_path)
+    archived = await message_archive.archive_cold_partitions(older_than=datetime.utcnow() + timedelta(days=1))
+    assert archived == ["messages_p0"]
+    assert (tmp_path / "messages_p0.ndjson.gz").exists()
+
+    print("3. History reads fall through to the archive, in both directions")
+    response = await client.get(f"/conversations/{state['dm_conv_id']}/messages?limit=100", headers=state["headers_B"])
+    assert [m["id"] for m in response.json()["messages"]] == before_ids
+    response = await client.get(f"/conversations/{state['dm_conv_id']}/messages?limit=2", headers=state["headers_B"])
+    data = response.json()
+    assert [m["id"] for m in data["messages"]] == before_ids[-2:]
+    response = await client.get(
+        f"/conversations/{state['dm_conv_id']}/messages?before={data['next_cursor']}&limit=2", headers=state["headers_B"]
+    )
+    assert [m["id"] for m in response.json()["messages"]] == before_ids[-4:-2]
+    response = await client.get(
+        f"/conversations/{state['dm_conv_id']}/messages?after={before_ids[0]}&limit=2", headers=state["headers_B"]
+    )
+    assert [m["id"] for m in response.json()["messages"]] == before_ids[1:3]
+
+    print("4. New messages land in the live partition after the archived history")
+    from app.routes.messaging import _store_message
+    async with TestSessionLocal() as db:
+        await _store_message(db, state["dm_conv_id"], state["user_idA"], "After archiving", datetime.utcnow())
+        await db.commit()
+    response = await client.get(f"/conversations/{state['dm_conv_id']}/messages?limit=100", headers=state["headers_B"])
+    msgs = response.json()["messages"]
+    assert [m["id"] for m in msgs[:-1]] == before_ids
+    assert msgs[-1]["body"] == "After archiving" and msgs[-1]["id"] > MESSAGES_PARTITION_SIZE
+
+    print("5. Export includes archived history")
+    response = await client.get(f"/conversations/{state['dm_conv_id']}/export", headers=state["headers_B"])
+    assert [json.loads(line)["id"] for line in response.text.splitlines()] == [m["id"] for m in msgs]
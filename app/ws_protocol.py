@@ -0,0 +1,69 @@
+from fastapi import WebSocket
+import json
+import msgpack
+
+# ── WebSocket Wire Codecs ───────────────────────────────────────
+# JSON text frames are the default. Clients that offer the `mates.msgpack`
+# subprotocol in Sec-WebSocket-Protocol get MessagePack binary frames with the
+# same message shapes. Compression (permessage-deflate) is negotiated by the
+# ASGI server for either codec (uvicorn: --ws-per-message-deflate, on by default).
+
+MSGPACK_SUBPROTOCOL = "mates.msgpack"
+
+
+class JsonCodec:
+    name = "json"
+    subprotocol = None
+
+    @staticmethod
+    def encode(data: dict) -> str:
+        return json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+
+    @staticmethod
+    def decode(raw: str) -> dict:
+        data = json.loads(raw)
+        if not isinstance(data, dict):
+            raise ValueError("Frame must be an object")
+        return data
+
+    async def receive(self, ws: WebSocket) -> dict:
+        return self.decode(await ws.receive_text())
+
+    async def send(self, ws: WebSocket, data: dict):
+        await ws.send_text(self.encode(data))
+
+
+class MsgpackCodec:
+    name = "msgpack"
+    subprotocol = MSGPACK_SUBPROTOCOL
+
+    @staticmethod
+    def encode(data: dict) -> bytes:
+        return msgpack.packb(data, use_bin_type=True)
+
+    @staticmethod
+    def decode(raw: bytes) -> dict:
+        data = msgpack.unpackb(raw, raw=False)
+        if not isinstance(data, dict):
+            raise ValueError("Frame must be a map")
+        return data
+
+    async def receive(self, ws: WebSocket) -> dict:
+        return self.decode(await ws.receive_bytes())
+
+    async def send(self, ws: WebSocket, data: dict):
+        await ws.send_bytes(self.encode(data))
+
+
+# codec.decode raises ValueError (json.JSONDecodeError and all msgpack unpack
+# errors subclass it) for frames that aren't an object in the negotiated encoding
+JSON = JsonCodec()
+MSGPACK = MsgpackCodec()
+
+
+def negotiate(ws: WebSocket):
+    """Pick the codec from the subprotocols the client offered. Pass
+    `codec.subprotocol` to ws.accept()."""
+    if MSGPACK_SUBPROTOCOL in ws.scope.get("subprotocols", []):
+        return MSGPACK
+    return JSON
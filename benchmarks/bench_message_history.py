@@ -0,0 +1,118 @@
+"""Message history page latency vs. depth.
+
+Seeds a scratch Postgres database with millions of messages spread across many
+conversations, then times one 50-message page of a single conversation at
+increasing depths, using the same query get_messages runs. Run it with and
+without ix_messages_conversation_id_id to compare.
+
+    BENCH_DATABASE_URL=postgresql+asyncpg://... python -m benchmarks.bench_message_history \
+        --messages 2000000 --conversations 1000 [--drop-index]
+
+The target database is wiped (drop_all/create_all) on every run.
+"""
+from dotenv import load_dotenv
+load_dotenv()
+
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+BENCH_DATABASE_URL = os.getenv("BENCH_DATABASE_URL")
+if not BENCH_DATABASE_URL:
+    raise RuntimeError("BENCH_DATABASE_URL is not set. Point it at a scratch Postgres database.")
+os.environ.setdefault("ASYNC_DATABASE_URL", BENCH_DATABASE_URL)
+
+from sqlalchemy import text, select
+from sqlalchemy.ext.asyncio import create_async_engine
+from app.models import metadata, messages
+from app.routes.messaging import _message_page_query
+from app.message_archive import message_archive
+
+DEPTHS = [0.0, 0.25, 0.5, 0.75, 0.99]
+
+
+async def seed(engine, n_messages: int, n_conversations: int):
+    async with engine.begin() as conn:
+        await conn.run_sync(metadata.drop_all)
+        await conn.run_sync(metadata.create_all)
+        await message_archive.ensure_partitions(conn, through_id=n_messages)
+        await conn.execute(text(
+            "INSERT INTO users (id, email, location_preference) VALUES "
+            "(1, 'bench-a@test.com', 'same_city'), (2, 'bench-b@test.com', 'same_city')"
+        ))
+        await conn.execute(text(
+            "INSERT INTO conversations (id, type, created_at) "
+            "SELECT g, 'dm', now() FROM generate_series(1, :n) g"
+        ), {"n": n_conversations})
+        # Round-robin across conversations so each one's history is interleaved with the rest
+        await conn.execute(text(
+            "INSERT INTO messages (conversation_id, sender_id, body, created_at) "
+            "SELECT 1 + (g % :c), 1 + (g % 2), 'benchmark message ' || g, "
+            "       now() - make_interval(secs => :n - g) "
+            "FROM generate_series(1, :n) g"
+        ), {"n": n_messages, "c": n_conversations})
+        await conn.execute(text("ANALYZE messages"))
+
+
+async def time_page(conn, conversation_id: int, before: int | None, limit: int, repeats: int) -> float:
+    query = _message_page_query(conversation_id, before, None, limit)
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = await conn.execute(query)
+        result.fetchall()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=2_000_000)
+    parser.add_argument("--conversations", type=int, default=1000)
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--drop-index", action="store_true", help="measure without the composite index")
+    parser.add_argument("--skip-seed", action="store_true", help="reuse data from a previous run")
+    args = parser.parse_args()
+
+    engine = create_async_engine(BENCH_DATABASE_URL, echo=False)
+
+    if not args.skip_seed:
+        start = time.perf_counter()
+        await seed(engine, args.messages, args.conversations)
+        print(f"Seeded {args.messages:,} messages in {time.perf_counter() - start:.1f}s")
+
+    async with engine.begin() as conn:
+        if args.drop_index:
+            await conn.execute(text("DROP INDEX IF EXISTS ix_messages_conversation_id_id"))
+        else:
+            await conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_messages_conversation_id_id ON messages (conversation_id, id)"
+            ))
+        await conn.execute(text("ANALYZE messages"))
+
+    conversation_id = 1
+    async with engine.connect() as conn:
+        result = await conn.execute(
+            select(messages.c.id)
+            .where(messages.c.conversation_id == conversation_id)
+            .order_by(messages.c.id.desc())
+        )
+        ids = [r.id for r in result.fetchall()]
+
+        label = "without" if args.drop_index else "with"
+        print(f"Conversation {conversation_id}: {len(ids):,} messages, page size {args.limit}, "
+              f"{label} ix_messages_conversation_id_id")
+        print(f"{'depth':>8} {'cursor':>12} {'median ms':>10}")
+        for depth in DEPTHS:
+            before = ids[int(depth * (len(ids) - 1))] if depth > 0 else None
+            ms = await time_page(conn, conversation_id, before, args.limit, args.repeats)
+            print(f"{depth:>8.0%} {str(before):>12} {ms:>10.2f}")
+
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
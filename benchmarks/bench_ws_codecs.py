@@ -0,0 +1,115 @@
+"""CPU and wire size of the WebSocket codecs.
+
+Encodes and decodes a representative mix of frames (typing, message,
+notification) with the JSON and MessagePack codecs from app.ws_protocol, and
+reports CPU time per 10k frames and bytes on the wire, raw and after
+permessage-deflate (emulated with a shared zlib stream, the default
+context-takeover mode).
+
+    python -m benchmarks.bench_ws_codecs [--frames 10000] [--rounds 5]
+"""
+import argparse
+import copy
+import statistics
+import time
+import zlib
+
+from app.ws_protocol import JSON, MSGPACK
+
+FRAMES = {
+    "typing": {
+        "type": "typing",
+        "conversation_id": 4812,
+        "user_id": 10233,
+        "user_name": "Angelika",
+    },
+    "message": {
+        "type": "message",
+        "conversation_id": 4812,
+        "message": {
+            "id": 18233411,
+            "conversation_id": 4812,
+            "sender_id": 10233,
+            "sender_name": "Angelika",
+            "sender_avatar_url": "/static/avatars/10233_thumb.jpg",
+            "body": "Are we still doing the grocery run tonight? I can drive if you make the list.",
+            "created_at": "2026-10-19T18:04:11.532101",
+        },
+    },
+    "notification": {
+        "type": "notification",
+        "notification": {
+            "id": 99312,
+            "event_type": "new_group_message",
+            "actor_id": 10233,
+            "title": "Angelika in Casa Verde: Are we still doing the grocery run tonight?",
+            "body": "Are we still doing the grocery run tonight? I can drive if you make the list.",
+            "data": {"conversation_id": 4812, "user_id": 10233},
+            "created_at": "2026-10-19T18:04:11.548019",
+        },
+    },
+}
+
+
+def make_frame(kind: str, i: int) -> dict:
+    """Template frame with per-frame ids so deflate can't collapse exact repeats."""
+    frame = copy.deepcopy(FRAMES[kind])
+    if kind == "message":
+        frame["message"]["id"] += i
+        frame["message"]["created_at"] = f"2026-10-19T18:{i // 60 % 60:02d}:{i % 60:02d}.{i % 999983:06d}"
+    elif kind == "notification":
+        frame["notification"]["id"] += i
+        frame["notification"]["created_at"] = f"2026-10-19T18:{i // 60 % 60:02d}:{i % 60:02d}.{i % 999983:06d}"
+    else:
+        frame["conversation_id"] += i % 7
+    return frame
+
+
+def deflated_size(payloads: list) -> int:
+    """Bytes on the wire with permessage-deflate: one raw-deflate stream per
+    connection, each message sync-flushed with the 4-byte tail stripped."""
+    compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+    total = 0
+    for p in payloads:
+        data = p.encode("utf-8") if isinstance(p, str) else p
+        out = compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        total += len(out) - 4
+    return total
+
+
+def run(codec, frames: list[dict], rounds: int):
+    encode_ms, decode_ms = [], []
+    encoded = []
+    for _ in range(rounds):
+        start = time.process_time()
+        encoded = [codec.encode(f) for f in frames]
+        encode_ms.append((time.process_time() - start) * 1000)
+
+        start = time.process_time()
+        for e in encoded:
+            codec.decode(e)
+        decode_ms.append((time.process_time() - start) * 1000)
+
+    raw_bytes = sum(len(e.encode("utf-8")) if isinstance(e, str) else len(e) for e in encoded)
+    return statistics.median(encode_ms), statistics.median(decode_ms), raw_bytes, deflated_size(encoded)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--frames", type=int, default=10_000)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    # Typing indicators dominate real traffic; weight the mix accordingly
+    mix = ["typing"] * 6 + ["message"] * 3 + ["notification"]
+    frames = [make_frame(mix[i % len(mix)], i) for i in range(args.frames)]
+
+    print(f"{args.frames:,} frames (60% typing, 30% message, 10% notification), median of {args.rounds} rounds")
+    print(f"{'codec':>8} {'encode ms':>10} {'decode ms':>10} {'raw bytes':>11} {'deflate bytes':>14}")
+    for codec in (JSON, MSGPACK):
+        enc, dec, raw, deflated = run(codec, frames, args.rounds)
+        print(f"{codec.name:>8} {enc:>10.2f} {dec:>10.2f} {raw:>11,} {deflated:>14,}")
+
+
+if __name__ == "__main__":
+    main()